@@ -0,0 +1,130 @@
+import threading
+
+from changes import ChangesGone
+
+
+def _leaf(total):
+    return {"minutes": total[0], "sessions": total[1]}
+
+
+# === RUNNING TOTALS ===
+# Sums of one numeric field of a list collection (minutes of the time log),
+# grouped several ways at once. `paths(record)` gives the record's path of keys
+# in each dimension, e.g. {"day": ("2025-07-10",), "week_category":
+# ("2025-07-07", "work")}; the totals are nested dicts ending in [sum, count].
+#
+# Like the search index it follows the change log: every read first applies
+# what was written since the last one (in any worker), which costs only the
+# records that changed, and then answers from the totals without touching the
+# raw records. It keeps each record's paths and amount by list position so a
+# delete or an edit can take the old values back out. If the change log was
+# trimmed past it, or the collection was replaced, it starts over from the store.
+class RunningTotals:
+    def __init__(self, store, change_log, name, filename, dimensions, paths, amount):
+        self.store = store
+        self.change_log = change_log
+        self.name = name  # collection name in the change log
+        self.filename = filename
+        self.dimensions = dimensions
+        self.paths = paths  # fn(record) -> {dimension: tuple of keys}; missing dimensions are skipped
+        self.amount = amount  # fn(record) -> number
+        self._lock = threading.Lock()
+        self._seq = None
+
+    def get(self, dimension, *path):
+        """{"minutes", "sessions"} for one path; zeros if nothing was logged."""
+        with self._lock:
+            self._catch_up()
+            node = self._totals[dimension]
+            for key in path:
+                node = node.get(key)
+                if node is None:
+                    return _leaf([0, 0])
+            return _leaf(node)
+
+    def table(self, dimension, *prefix):
+        """Every path under `prefix` as nested dicts of {"minutes", "sessions"}."""
+        with self._lock:
+            self._catch_up()
+            node = self._totals[dimension]
+            for key in prefix:
+                node = node.get(key, {})
+            return self._export(node)
+
+    def _export(self, node):
+        if isinstance(node, list):
+            return _leaf(node)
+        return {key: self._export(child) for key, child in sorted(node.items())}
+
+    # --- keeping up ---
+    def _catch_up(self):
+        if self._seq is None:
+            return self._rebuild()
+        while True:
+            try:
+                changes, last_seq = self.change_log.since(self._seq, 5000)
+            except ChangesGone:
+                return self._rebuild()
+            for change in changes:
+                if change["collection"] != self.name:
+                    continue
+                if change["op"] == "reset":
+                    return self._rebuild()
+                self._apply(change)
+            if changes:
+                self._seq = changes[-1]["seq"]
+            if self._seq >= last_seq:
+                return
+
+    def _rebuild(self):
+        self._totals = {dimension: {} for dimension in self.dimensions}
+        self._order = []  # per list position: (paths, amount) it contributed
+        with self.store.lock(self.filename):
+            self._seq = self.change_log.last_seq
+            records = self.store.load(self.filename, [])
+            for record in (records if isinstance(records, list) else []):
+                self._order.append(self._add(record))
+
+    def _apply(self, change):
+        key = change["key"]
+        if change["op"] == "delete":
+            self._remove(self._order.pop(key))
+        elif key < len(self._order):
+            self._remove(self._order[key])
+            self._order[key] = self._add(change["value"])
+        else:
+            self._order.append(self._add(change["value"]))
+
+    def _add(self, record):
+        if not isinstance(record, dict):
+            return {}, 0
+        try:
+            amount = self.amount(record)
+            paths = self.paths(record)
+        except (KeyError, TypeError, ValueError):
+            return {}, 0
+        for dimension, path in paths.items():
+            self._bump(self._totals[dimension], path, amount, 1)
+        return paths, amount
+
+    def _remove(self, contribution):
+        paths, amount = contribution
+        for dimension, path in paths.items():
+            self._bump(self._totals[dimension], path, -amount, -1)
+
+    def _bump(self, node, path, amount, count):
+        *parents, last = path
+        trail = []
+        for key in parents:
+            trail.append((node, key))
+            node = node.setdefault(key, {})
+        total = node.setdefault(last, [0, 0])
+        total[0] += amount
+        total[1] += count
+        if total[1] <= 0:
+            del node[last]
+            # Drop the branches that are now empty
+            for parent, key in reversed(trail):
+                if parent[key]:
+                    break
+                del parent[key]
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+AI_WORKERS = int(os.environ.get("AI_WORKERS", "4"))
+AI_TIMEOUT = float(os.environ.get("AI_TIMEOUT", "30"))
+AI_RETRIES = int(os.environ.get("AI_RETRIES", "2"))
+AI_JOB_TTL = float(os.environ.get("AI_JOB_TTL", "3600"))
+AI_CACHE_TTL = float(os.environ.get("AI_CACHE_TTL", "600"))
+AI_CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", "500"))
+
+
+# === RETRIES ===
+def with_retries(fn, retry_on, retries=AI_RETRIES, backoff=1.0):
+    """Call `fn()`, retrying `retry_on` errors with exponential backoff.
+    Returns (result, attempts)."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(), attempt
+        except retry_on:
+            if attempt > retries:
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+
+# === FAKE CLIENT ===
+# Stand-in for openai.OpenAI (AI_CLIENT=fake) so the pipeline can be run and
+# benchmarked without the network. Every non-empty line of the prompt becomes
+# a task; "delay" simulates model latency.
+class FakeClient:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, timeout=None, **kwargs):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        prompt = messages[-1]["content"]
+        content = json.dumps({"tasks": [{"title": line.strip()} for line in prompt.splitlines() if line.strip()]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def make_client():
+    """(client, exceptions worth retrying). openai is imported here rather than
+    at the top: it takes longer to import than the rest of the app together,
+    so it is only loaded when the first /ai job runs."""
+    if os.environ.get("AI_CLIENT") == "fake":
+        return FakeClient(), (TimeoutError, ConnectionError)
+    import openai
+    # Retries are done by with_retries(), not the client
+    return (openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0),
+            (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+
+# === PROMPT KEYS ===
+def prompt_key(prompt, day):
+    """Cache key for a prompt on a given day: case, spacing and trailing
+    punctuation don't count, so a retry or double-click maps to the same job."""
+    text = " ".join(prompt.casefold().split()).rstrip(".!?;, ")
+    return hashlib.sha1(f"{day}\n{text}".encode()).hexdigest()
+
+
+# === JOB QUEUE ===
+# Jobs are records in a dict collection of the store, so any gunicorn worker
+# can answer GET /ai/jobs/<id>; the job itself runs on a thread pool in the
+# worker that accepted it. The pool is started on first use, after gunicorn
+# has forked. A job left "queued"/"running" by a worker that died stays that
+# way until it expires.
+#
+# The same collection is the response cache. A prompt whose key matches a job
+# that is still queued/running joins it (coalesced), one that finished less
+# than AI_CACHE_TTL ago gets its result back (hit); both get the existing job
+# instead of a second model call and a second set of planner entries. Past
+# AI_CACHE_SIZE jobs the least recently used finished ones are dropped.
+class JobQueue:
+    def __init__(self, store, filename, run, workers=AI_WORKERS):
+        self.store = store
+        self.filename = filename
+        self.run = run  # fn(payload) -> result dict
+        self.workers = workers
+        self.stats = {"hit": 0, "coalesced": 0, "miss": 0}  # this process only
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def submit(self, payload, key=None):
+        """(job, outcome) where outcome is "hit", "coalesced" or "miss"."""
+        now = time.time()
+        with self.store.lock(self.filename):
+            jobs = self.store.load(self.filename, {})
+            cached = self._lookup(jobs, key, now) if key else None
+            if cached is not None:
+                outcome = "hit" if cached["status"] == "done" else "coalesced"
+                self.stats[outcome] += 1
+                cached = {**cached, "used_at": now}
+                self.store.set(self.filename, cached["id"], cached)
+                return cached, outcome
+
+            self._evict(jobs, now)
+            job = {"id": uuid.uuid4().hex, "status": "queued", "created_at": now, "updated_at": now, "used_at": now}
+            if key:
+                job["key"] = key
+            self.store.set(self.filename, job["id"], job)
+            self.stats["miss"] += 1
+        self._executor().submit(self._work, job["id"], payload)
+        return job, "miss"
+
+    def get(self, job_id):
+        return self.store.load(self.filename, {}).get(job_id)
+
+    def cache_info(self):
+        jobs = self.store.load(self.filename, {})
+        lookups = sum(self.stats.values())
+        return {**self.stats,
+                "hit_rate": round((self.stats["hit"] + self.stats["coalesced"]) / lookups, 3) if lookups else None,
+                "size": len(jobs), "max_size": AI_CACHE_SIZE, "ttl": AI_CACHE_TTL}
+
+    def _lookup(self, jobs, key, now):
+        for job in jobs.values():
+            # Unfinished jobs older than the TTL are assumed lost with their worker
+            if job.get("key") == key and job["status"] != "failed" and now - job["updated_at"] <= AI_CACHE_TTL:
+                return job
+        return None
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="ai-job")
+            return self._pool
+
+    def _update(self, job_id, **fields):
+        with self.store.lock(self.filename):
+            job = self.store.load(self.filename, {}).get(job_id)
+            if job is not None:
+                self.store.set(self.filename, job_id, {**job, **fields, "updated_at": time.time()})
+
+    def _work(self, job_id, payload):
+        self._update(job_id, status="running")
+        try:
+            result = self.run(payload)
+        except Exception as e:
+            print("AI job error:", e)
+            self._update(job_id, status="failed", error=str(e))
+        else:
+            self._update(job_id, status="done", result=result)
+
+    def _evict(self, jobs, now):
+        expired = {k for k, j in jobs.items() if now - j.get("updated_at", 0) > AI_JOB_TTL}
+        finished = sorted((j.get("used_at", j["updated_at"]), k) for k, j in jobs.items()
+                          if k not in expired and j["status"] in ("done", "failed"))
+        over = len(jobs) - len(expired) + 1 - AI_CACHE_SIZE
+        for job_id in [*expired, *(k for _, k in finished[:max(over, 0)])]:
+            self.store.delete(self.filename, job_id)
@@ -1,12 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
+from functools import lru_cache, partial, wraps
 import json
 import os
-from flask_cors import CORS, cross_origin
-import openai
-from datetime import datetime
-from zoneinfo import ZoneInfo
+import shlex
+import sys
+from flask_cors import CORS
+from datetime import datetime, timedelta, timezone
+import atexit
+import gzip
+import itertools
+import threading
+import time
 import uuid
-from dateutil import parser  # For parsing ISO strings safely
+from dates import VEGAS, normalize, normalize_note, parse_date
+from store import IdIndex, Store, open_store
+from changes import ChangeLog, ChangesGone
+from search import SearchIndex
+from resources import Resource
+from partitions import Partitioned
+from aggregates import RunningTotals
+from responses import body_cache, json_response
+import query
+import recurrence
+import ai_jobs
+import autosave
+import metrics
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": [
@@ -15,11 +33,23 @@ CORS(app, resources={r"/*": {"origins": [
     "https://avdevplanner.netlify.app",
     "https://localhost",
     "capacitor://localhost"
-]}}, supports_credentials=True)
-
-client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-DATA_DIR = "/mnt/data"
+]}}, supports_credentials=True, expose_headers=["ETag", "X-Next-Cursor", "X-AI-Cache"])
+
+# The AI client is created by the first /ai job (see ai_client()), not at
+# import, so a cold start doesn't wait for the openai package. AI_CLIENT=fake
+# swaps in a local stand-in (no network) for development and benchmarks.
+_ai_client = None
+_ai_client_lock = threading.Lock()
+
+def ai_client():
+    """(client, exceptions worth retrying)"""
+    global _ai_client
+    with _ai_client_lock:
+        if _ai_client is None:
+            _ai_client = ai_jobs.make_client()
+        return _ai_client
+
+DATA_DIR = os.environ.get("DATA_DIR", "/mnt/data")
 TASK_FILE = os.path.join(DATA_DIR, 'tasks.json')
 GOAL_FILE = os.path.join(DATA_DIR, 'goals.json')
 LOG_FILE = os.path.join(DATA_DIR, 'logs.json')
@@ -29,547 +59,881 @@ LESSON_FILE = os.path.join(DATA_DIR, 'lessons.json')
 SCHEDULE_FILE = os.path.join(DATA_DIR, 'schedule.json')
 TIME_FILE = os.path.join(DATA_DIR, 'time.json')
 REFLECTIONS_FILE = os.path.join(DATA_DIR, 'reflections.json')
+COLLECTIONS_FILE = os.path.join(DATA_DIR, 'collections.json')
+AI_JOB_FILE = os.path.join(DATA_DIR, 'ai_jobs.json')
+
+# STORAGE_BACKEND=json (default) keeps the JSON files; sqlite uses SQLITE_PATH
+store = open_store(DATA_DIR)
+
+# Latency, response size and storage/date-parsing/OpenAI time, served as
+# Prometheus text on /metrics. METRICS=0 turns it off, METRICS_LOG=1 adds a
+# JSON log line per request.
+METRICS_DIR = os.path.join(DATA_DIR, "metrics")
+metrics.instrument_store(store)
+metrics.init_app(app, METRICS_DIR)
+
+def check_time_entry(entry):
+    if not query.is_day(entry.get("date")):
+        return "date must be YYYY-MM-DD"
+    minutes = entry.get("minutes")
+    if isinstance(minutes, bool) or not isinstance(minutes, int) or not 0 < minutes <= 24 * 60:
+        return "minutes must be a whole number between 1 and 1440"
+    return None
+
+def normalize_note_revision(note):
+    """normalize_note, plus the content revision PATCH /notes/<id> works from."""
+    normalize_note(note)
+    content = note.get("content")
+    note["revision"] = autosave.revision(content if isinstance(content, str) else "")
+    return note
+
+# Tasks, goals, notes, lessons, time entries and schedule items are declared
+# once here; their routes, ids, prettyDate/prettyTime and /batch support all
+# come from these (see RESOURCE ROUTES). An update to goals and notes only
+# takes the listed fields. Schedule items can repeat (see recurrence.py).
+RESOURCES = {r.name: r for r in [
+    Resource("tasks", "task", TASK_FILE,
+             {"title": "", "notes": "", "date": "", "time": "", "completed": False, "subtasks": []},
+             by_index=True),
+    Resource("goals", "goal", GOAL_FILE,
+             {"title": "", "notes": "", "date": "", "time": "", "completed": False},
+             editable=("title", "notes", "date", "time", "completed"), by_index=True),
+    Resource("notes", "note", NOTE_FILE,
+             {"title": "", "content": "", "date": "", "pinned": False, "created_at": "", "tags": [], "notebook": ""},
+             ids="int", editable=("title", "content", "pinned", "modified_at", "tags", "notebook"),
+             normalize=normalize_note_revision, day_fn=query.note_day),
+    Resource("lessons", "lesson", LESSON_FILE,
+             {"title": "", "description": "", "category": "", "date": "", "time": "", "priority": "",
+              "notes": "", "completed": False},
+             initial={"completed": False}),
+    Resource("time", "time_entry", TIME_FILE,
+             {"date": "", "minutes": 0, "category": "", "note": ""},
+             validate=check_time_entry, list_route=False),
+    Resource("schedule", "schedule_item", SCHEDULE_FILE,
+             {"title": "", "date": "", "time": "", "notes": "", "repeat": ""},
+             validate=recurrence.check, list_route=False, span_fn=recurrence.span),
+]}
+
+# Logs (by day), reflections (by week) and focus (by day) are stored one
+# month per segment, so writes and date-range reads only touch the months
+# involved. The old single-file logs.json/reflections.json/focus.json are split
+# up on first start. ARCHIVE_AFTER_MONTHS=n gzips months older than that out
+# of the store.
+#
+# The schedule stays one list collection: its items are addressed by id and
+# list position like the other resources, and a repeating item spans any
+# number of months, so it doesn't belong to one segment. Appends to it are
+# journal records, and windowed reads go through its interval index
+# (query.occurrences), so neither rewrites nor scans the whole history.
+logs = Partitioned(store, DATA_DIR, "logs")
+reflections = Partitioned(store, DATA_DIR, "reflections")
+focus = Partitioned(store, DATA_DIR, "focus")
+logs.migrate(LOG_FILE)
+reflections.migrate(REFLECTIONS_FILE)
+focus.migrate(FOCUS_FILE)
+
+ARCHIVE_AFTER_MONTHS = int(os.environ.get("ARCHIVE_AFTER_MONTHS", "0"))
+if ARCHIVE_AFTER_MONTHS:
+    _now = datetime.now(VEGAS)
+    _months = _now.year * 12 + _now.month - 1 - ARCHIVE_AFTER_MONTHS
+    logs.archive(f"{_months // 12:04d}-{_months % 12 + 1:02d}")
+    reflections.archive(f"{_months // 12:04d}-{_months % 12 + 1:02d}")
+    focus.archive(f"{_months // 12:04d}-{_months % 12 + 1:02d}")
+
+# Every write to these collections also goes to the change log (GET /changes)
+change_log = ChangeLog(os.path.join(DATA_DIR, "changes.log"))
+TRACKED = {r.filename: name for name, r in RESOURCES.items()}
+
+def record_changes(filename, changes):
+    if filename in TRACKED:
+        change_log.record(TRACKED[filename], changes)
+    elif logs.owns(filename):
+        change_log.record("logs", changes)
+
+store.on_write(record_changes)
+
+search_index = SearchIndex(store, change_log, {"notes": NOTE_FILE, "lessons": LESSON_FILE}, {"logs": logs})
+
+# Minutes logged per day, week (starting Monday), month, category and
+# week+category, kept up to date from the change log (see aggregates.py)
+@lru_cache(maxsize=4096)
+def week_of(day):
+    d = datetime.strptime(day, "%Y-%m-%d")
+    return (d - timedelta(days=d.weekday())).strftime("%Y-%m-%d")
+
+def time_paths(entry):
+    day = query.day_key(entry.get("date"))
+    if not day:
+        return {}
+    week, category = week_of(day), entry.get("category") or "uncategorized"
+    return {"day": (day,), "week": (week,), "month": (day[:7],), "category": (category,),
+            "week_category": (week, category)}
+
+time_totals = RunningTotals(store, change_log, "time", TIME_FILE,
+                            ("day", "week", "month", "category", "week_category"), time_paths,
+                            lambda entry: entry["minutes"])
 
 # === UTILITIES ===
+# Reads are served from the resident store; it only re-parses a file when its
+# mtime/inode changes. save_json rewrites the whole file, so handlers that touch
+# a single item use the store's append/set/delete journal ops instead.
 def load_json(filename, default):
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            return json.load(f)
-    return default
+    return store.load(filename, default)
 
 def save_json(filename, data):
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def get_vegas_time():
-    return datetime.now(ZoneInfo("America/Los_Angeles"))
+    store.save(filename, data)
+
+# Each collection carries a version that changes on every write; it is sent as
+# the ETag. Mutating routes hold the collection lock (shared across gunicorn
+# workers) for their whole read-modify-write, and refuse with 412 when the
+# client sends an If-Match that no longer matches.
+def collection_etag(filename):
+    return str(store.version(filename))
+
+def with_etag(response, etag):
+    response = make_response(response)
+    response.set_etag(str(etag))
+    return response
+
+def stale(etag):
+    return request.if_match and not request.if_match.contains(str(etag))
+
+def precondition_failed():
+    return jsonify({"error": "Data changed on the server, reload and try again"}), 412
+
+def locked(filename):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with store.lock(filename):
+                if stale(collection_etag(filename)):
+                    return precondition_failed()
+                return with_etag(fn(*args, **kwargs), collection_etag(filename))
+        return wrapper
+    return decorator
+
+# GETs go through json_response: 304 when the client already has this
+# version, otherwise a cached (and compressed, when large) body.
+def collection_response(filename, default):
+    data, version = store.load_versioned(filename, default)
+    return json_response(lambda: (data, {}), version, store.modified(filename))
+
+# List endpoints accept ?start=&end= (dates, inclusive), completed=, tag=,
+# notebook=, limit=, cursor= and fields=a,b. The next page's cursor comes back
+# in the X-Next-Cursor header so the body stays a plain list.
+def list_response(filename, records, version, day_fn=query.record_day, select=None, modified=None):
+    select = select or (lambda: query.select(filename, records, version, request.args, day_fn))
+
+    def build():
+        page = select()
+        if page is None:
+            return records, {}
+        return page.items, ({"X-Next-Cursor": page.next_cursor} if page.next_cursor else {})
 
-def format_pretty_date(dt_obj):
-    return dt_obj.strftime("%B %-d, %Y").replace(" 0", " ")
-
-def format_pretty_time(dt_obj):
-    return dt_obj.strftime("%-I:%M %p").lower()
-
-def parse_datetime_safe(date_str):
     try:
-        return parser.parse(date_str)
-    except:
-        return None
-# === TASKS ===
-@app.route('/tasks', methods=['GET'])
-def get_tasks():
-    tasks = load_json(TASK_FILE, [])
-    for task in tasks:
-        # Safe date parsing
-        date_str = task.get("date", "")
-        date_obj = None
-        if date_str:
-            try:
-                if "T" in date_str:
-                    date_obj = parse_datetime_safe(date_str)
-                else:
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            except Exception as e:
-                print("Date parse error:", e)
-
-        # Safe time parsing
-        # Safe time parsing
-# Safe time parsing
-            time_str = task.get("time", "")
-            time_obj = None
-            if time_str:
-                try:
-                # Expecting HH:MM format
-                    h, m = map(int, time_str.split(":"))
-                    now_vegas = datetime.now(ZoneInfo("America/Los_Angeles"))
-                    time_obj = now_vegas.replace(hour=h, minute=m, second=0, microsecond=0)
-                except Exception as e:
-                    print("Time parse error:", e)
-
-
-
-        if date_obj:
-            if date_obj.tzinfo is None:
-                date_obj = date_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                date_obj = date_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            task["prettyDate"] = format_pretty_date(date_obj)
+        return json_response(build, version, modified if filename is None else store.modified(filename))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        if time_obj:
-            if time_obj.tzinfo is None:
-                time_obj = time_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                time_obj = time_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            task["prettyTime"] = format_pretty_time(time_obj)
-
-    return jsonify(tasks)
-
-@app.route('/tasks/<int:index>', methods=['PUT'])
-def update_task(index):
-    tasks = load_json(TASK_FILE, [])
-    if 0 <= index < len(tasks):
-        updated = request.json
-        tasks[index].update(updated)
-        save_json(TASK_FILE, tasks)
-        return jsonify({"message": "Task updated"}), 200
-    return jsonify({"error": "Task not found"}), 404
-
-@app.route('/tasks', methods=['POST'])
-@cross_origin()
-def add_task():
-    try:
-        data = request.json
-        if not data:
+def get_vegas_time():
+    return datetime.now(VEGAS)
+
+# === IDS ===
+# Every record gets a stable "id" when it is created: a uuid4 string, except
+# notes, which keep the integer ids the notes page builds its links from.
+# Lookups by id use the store's id index. The index-based task/goal routes
+# are still there for the current frontend; an index is only good until the
+# next delete.
+def new_id():
+    return str(uuid.uuid4())
+
+def locate(filename, index=None, record_id=None):
+    """List position for a by-id route, or for a legacy by-index one; None if missing."""
+    if record_id is not None:
+        return store.find(filename, "id", record_id)
+    return index if 0 <= index < len(load_json(filename, [])) else None
+
+def assign_ids(filename, numeric=False):
+    """Give records written before ids existed one (the next integers when
+    `numeric`), in a single batch write. Returns how many were missing."""
+    if all(isinstance(r, dict) and "id" in r for r in load_json(filename, [])):
+        return 0
+    with store.lock(filename):
+        records = load_json(filename, [])
+        make_id = itertools.count(store.max_id(filename) + 1).__next__ if numeric else new_id
+        fixes = [{"op": "set", "key": i, "value": {**r, "id": make_id()}}
+                 for i, r in enumerate(records) if isinstance(r, dict) and "id" not in r]
+        store.batch(filename, fixes)
+        return len(fixes)
+
+# === RESOURCE ROUTES ===
+# Generated for each resource r:
+#   GET    /<r.name>                     list (query params: see list_response)
+#   POST   /<r.name>                     create, answers with the new id
+#   PUT    /<r.name>/<id>                merge an update
+#   DELETE /<r.name>/<id>
+#   PATCH  /<r.name>/<id>/toggle         flip "completed", if it has one
+# by_index resources answer on /<r.name>/<int:index> as well. Endpoint names
+# are the old hand-written ones (get_tasks, add_task, update_task, ...).
+def add_resource_routes(r):
+    def not_found():
+        return jsonify({"error": f"{r.label} not found"}), 404
+
+    def get_all():
+        records, version = store.load_versioned(r.filename, [])
+        return list_response(r.filename, records, version, r.day_fn)
+
+    @locked(r.filename)
+    def add():
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data, dict):
             return jsonify({"error": "Missing JSON data"}), 400
-
-        tasks = load_json(TASK_FILE, [])
-        task = {
-            "title": data.get("title", ""),
-            "notes": data.get("notes", ""),
-            "date": data.get("date", ""),
-            "time": data.get("time", ""),
-            "completed": data.get("completed", False),
-            "subtasks": data.get("subtasks", [])
-        }
-        tasks.append(task)
-        save_json(TASK_FILE, tasks)
-        return jsonify({"message": "Task added"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/tasks/<int:index>', methods=['DELETE'])
-def delete_task(index):
-    tasks = load_json(TASK_FILE, [])
-    if 0 <= index < len(tasks):
-        tasks.pop(index)
-        save_json(TASK_FILE, tasks)
-        return jsonify({"message": "Task deleted"}), 200
-    return jsonify({"error": "Task not found"}), 404
-
-@app.route('/tasks/<int:index>/toggle', methods=['PATCH'])
-def toggle_task(index):
-    tasks = load_json(TASK_FILE, [])
-    if 0 <= index < len(tasks):
-        tasks[index]['completed'] = not tasks[index].get('completed', False)
-        save_json(TASK_FILE, tasks)
-        return jsonify({"message": "Task toggled"}), 200
-    return jsonify({"error": "Task not found"}), 404
-
-# === GOALS ===
-@app.route('/goals', methods=['GET'])
-def get_goals():
-    goals = load_json(GOAL_FILE, [])
-    for goal in goals:
-        # Safe date parsing
-        date_str = goal.get("date", "")
-        date_obj = None
-        if date_str:
-            try:
-                if "T" in date_str:
-                    date_obj = parse_datetime_safe(date_str)
-                else:
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            except Exception as e:
-                print("Goal date parse error:", e)
-
-        # Safe time parsing
-        time_str = goal.get("time", "")
-        time_obj = None
-        if time_str:
-            try:
-                h, m = map(int, time_str.split(":"))
-                now_vegas = datetime.now(ZoneInfo("America/Los_Angeles"))
-                time_obj = now_vegas.replace(hour=h, minute=m, second=0, microsecond=0)
-            except Exception as e:
-                print("Goal time parse error:", e)
-
-        if date_obj:
-            if date_obj.tzinfo is None:
-                date_obj = date_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                date_obj = date_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            goal["prettyDate"] = format_pretty_date(date_obj)
-
-        if time_obj:
-            if time_obj.tzinfo is None:
-                time_obj = time_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                time_obj = time_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            goal["prettyTime"] = format_pretty_time(time_obj)
-
-    return jsonify(goals)
-
-@app.route('/goals', methods=['POST'])
-@cross_origin()
-def add_goal():
-    try:
-        data = request.json
-        if not data:
+        record = r.new(data, store.max_id(r.filename) + 1 if r.int_ids else None)
+        if error := r.check(record):
+            return jsonify({"error": error}), 400
+        store.append(r.filename, record)
+        return jsonify({"message": f"{r.label} added", "id": record["id"]}), 201
+
+    @locked(r.filename)
+    def update(index=None, record_id=None):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
             return jsonify({"error": "Missing JSON data"}), 400
-
-        goals = load_json(GOAL_FILE, [])
-        goal = {
-            "title": data.get("title", ""),
-            "notes": data.get("notes", ""),
-            "date": data.get("date", ""),
-            "time": data.get("time", ""),
-            "completed": data.get("completed", False)
-        }
-        goals.append(goal)
-        save_json(GOAL_FILE, goals)
-        return jsonify({"message": "Goal added"}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/goals/<int:index>', methods=['PUT'])
-def update_goal(index):
-    goals = load_json(GOAL_FILE, [])
-    if 0 <= index < len(goals):
-        updated = request.json
-        goals[index]['title'] = updated.get('title', goals[index]['title'])
-        goals[index]['notes'] = updated.get('notes', goals[index]['notes'])
-        goals[index]['date'] = updated.get('date', goals[index].get('date'))
-        goals[index]['time'] = updated.get('time', goals[index].get('time', ""))
-        goals[index]['completed'] = updated.get('completed', goals[index].get('completed', False))
-        save_json(GOAL_FILE, goals)
-        return jsonify({"message": "Goal updated"}), 200
-    return jsonify({"error": "Goal not found"}), 404
-
-@app.route('/goals/<int:index>/toggle', methods=['PATCH'])
-def toggle_goal(index):
-    goals = load_json(GOAL_FILE, [])
-    if 0 <= index < len(goals):
-        goals[index]['completed'] = not goals[index].get('completed', False)
-        save_json(GOAL_FILE, goals)
-        return jsonify({"message": "Goal toggled"}), 200
-    return jsonify({"error": "Goal not found"}), 404
-
-@app.route('/goals/<int:index>', methods=['DELETE'])
-def delete_goal(index):
-    goals = load_json(GOAL_FILE, [])
-    if 0 <= index < len(goals):
-        goals.pop(index)
-        save_json(GOAL_FILE, goals)
-        return jsonify({"message": "Goal deleted"}), 200
-    return jsonify({"error": "Goal not found"}), 404
-
+        i = locate(r.filename, index, record_id)
+        if i is None:
+            return not_found()
+        current = load_json(r.filename, [])[i]
+        record = r.merge(current, data)
+        if error := r.check(record):
+            return jsonify({"error": error}), 400
+        if record != current:
+            store.set(r.filename, i, record)
+        return jsonify({"message": f"{r.label} updated"}), 200
+
+    @locked(r.filename)
+    def delete(index=None, record_id=None):
+        i = locate(r.filename, index, record_id)
+        if i is None:
+            return not_found()
+        store.delete(r.filename, i)
+        return jsonify({"message": f"{r.label} deleted"}), 200
+
+    @locked(r.filename)
+    def toggle(index=None, record_id=None):
+        i = locate(r.filename, index, record_id)
+        if i is None:
+            return not_found()
+        store.set(r.filename, i, r.toggled(load_json(r.filename, [])[i]))
+        return jsonify({"message": f"{r.label} toggled"}), 200
+
+    item_rules = [f"/{r.name}/<int:record_id>" if r.int_ids else f"/{r.name}/<record_id>"]
+    if r.by_index:
+        item_rules.insert(0, f"/{r.name}/<int:index>")
+    if r.list_route:
+        app.add_url_rule(f"/{r.name}", f"get_{r.name}", get_all, methods=["GET"])
+    app.add_url_rule(f"/{r.name}", f"add_{r.singular}", add, methods=["POST"])
+    for rule in item_rules:
+        app.add_url_rule(rule, f"update_{r.singular}", update, methods=["PUT"])
+        app.add_url_rule(rule, f"delete_{r.singular}", delete, methods=["DELETE"])
+        if r.toggle:
+            app.add_url_rule(rule + "/toggle", f"toggle_{r.singular}", toggle, methods=["PATCH"])
+
+def register_resource(r):
+    # Fill in prettyDate/prettyTime for records written before they were stored
+    store.on_load(r.filename, r.normalize_all)
+    assign_ids(r.filename, numeric=r.int_ids)
+    add_resource_routes(r)
+
+# time.json started out as one {"YYYY-MM-DD": minutes} dict (the shipped file
+# is still {}); the time log is a list of sessions, so each day becomes one
+# entry. A gzipped copy of the old file goes to the archive directory, like
+# the logs/reflections migration.
+def migrate_time_log():
+    """Convert a date-keyed time.json into entries; returns how many were kept."""
+    if not isinstance(load_json(TIME_FILE, []), dict):
+        return 0
+    r = RESOURCES["time"]
+    with store.lock(TIME_FILE):
+        legacy = load_json(TIME_FILE, [])
+        if not isinstance(legacy, dict):
+            return 0
+        if legacy:
+            archive_dir = os.path.join(DATA_DIR, "archive")
+            os.makedirs(archive_dir, exist_ok=True)
+            with gzip.open(os.path.join(archive_dir, f"time-legacy-{int(time.time())}.json.gz"), "wt") as f:
+                json.dump(legacy, f)
+        entries = []
+        for day, value in sorted(legacy.items()):
+            for item in value if isinstance(value, list) else [value]:
+                entry = r.new({**(item if isinstance(item, dict) else {"minutes": item}), "date": day})
+                if error := r.check(entry):
+                    print(f"Skipping time entry for {day}: {error}")
+                else:
+                    entries.append(entry)
+        save_json(TIME_FILE, entries)
+        return len(entries)
+
+migrate_time_log()
+register_resource(RESOURCES["tasks"])
+register_resource(RESOURCES["goals"])
+register_resource(RESOURCES["notes"])
+register_resource(RESOURCES["lessons"])
+register_resource(RESOURCES["time"])
+register_resource(RESOURCES["schedule"])
+
+# === NOTE AUTOSAVE ===
+# The notes page autosaves through PATCH /notes/<id> with only what changed:
+#   {"base": "<revision>", "delta": [{"retain": 120}, {"delete": 3}, {"insert": "abc"}],
+#    "title": ..., "pinned": ..., "tags": ..., "notebook": ..., "modified_at": ...}
+# "delta" (see autosave.py) edits the content whose revision is "base"; every
+# note carries its revision and each save answers with the new one. When the
+# note has moved on since, the answer is 409 with the current note. Without a
+# base, "content" replaces the whole text.
+#
+# A save that changes nothing isn't written. With NOTE_COALESCE_SECONDS > 0,
+# saves to one note within that window are written once, when it closes; any
+# other request this worker serves writes them first. The pending saves are
+# held in this process, so coalescing is only used with a single gunicorn
+# worker; with more (the Procfile runs 2) every save is written through.
+NOTE_PATCH_FIELDS = ("title", "pinned", "tags", "notebook")
+
+def gunicorn_workers():
+    """Workers gunicorn was started with, as far as the command line and
+    environment tell (1 when not running under gunicorn)."""
+    if not os.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn"):
+        return 1
+    workers = os.environ.get("WEB_CONCURRENCY", "1")
+    args = sys.argv[1:] + shlex.split(os.environ.get("GUNICORN_CMD_ARGS", ""))
+    for i, arg in enumerate(args):
+        if arg in ("-w", "--workers") and i + 1 < len(args):
+            workers = args[i + 1]
+        elif arg.startswith("--workers="):
+            workers = arg.split("=", 1)[1]
+        elif arg.startswith("-w") and len(arg) > 2:
+            workers = arg[2:]
+    return int(workers) if workers.isdigit() else 2
+
+NOTE_COALESCE_SECONDS = float(os.environ.get("NOTE_COALESCE_SECONDS", "0"))
+if NOTE_COALESCE_SECONDS > 0 and gunicorn_workers() > 1:
+    print("NOTE_COALESCE_SECONDS ignored: only safe with a single worker")
+    NOTE_COALESCE_SECONDS = 0
+
+def rebase_note(base, note, current):
+    return normalize_note_revision(autosave.rebase(base, note, current))
+
+def write_note(note_id, base, note):
+    i = locate(NOTE_FILE, record_id=note_id)
+    if i is None:
+        print(f"Pending save of note {note_id} not written: the note was deleted")
+        return
+    stored = load_json(NOTE_FILE, [])[i]
+    if stored != base:
+        note = rebase_note(base, note, stored)
+    store.set(NOTE_FILE, i, note)
+
+note_saves = autosave.Coalescer(lambda: store.lock(NOTE_FILE), write_note, NOTE_COALESCE_SECONDS, rebase_note)
+atexit.register(note_saves.flush)
+
+@app.before_request
+def flush_note_saves():
+    if request.endpoint != "patch_note":
+        note_saves.flush()
+
+@app.route('/notes/<int:note_id>', methods=['PATCH'])
+@locked(NOTE_FILE)
+def patch_note(note_id):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Missing JSON data"}), 400
+    i = locate(NOTE_FILE, record_id=note_id)
+    if i is None:
+        return jsonify({"error": "Note not found"}), 404
+    stored = load_json(NOTE_FILE, [])[i]
+    current = note_saves.current(note_id, stored)
+    content = current.get("content") if isinstance(current.get("content"), str) else ""
+    if "delta" in data:
+        if data.get("base") != autosave.revision(content):
+            return jsonify({"error": "Note changed on the server", "note": current}), 409
+        try:
+            content = autosave.apply_delta(content, data["delta"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    elif isinstance(data.get("content"), str):
+        content = data["content"]
+    changes = {"content": content, **{f: data[f] for f in NOTE_PATCH_FIELDS if f in data}}
+    if all(current.get(f) == v for f, v in changes.items()):
+        return jsonify({"message": "Note unchanged", "revision": autosave.revision(content)}), 200
+    modified_at = data.get("modified_at") or datetime.now(timezone.utc).isoformat()
+    note = RESOURCES["notes"].merge(current, {**changes, "modified_at": modified_at})
+    note_saves.put(note_id, stored, note)
+    return jsonify({"message": "Note saved", "revision": note["revision"]}), 200
 
 # === LOGS ===
+# logs and reflections are Partitioned (see above): ?start=&end= only opens
+# the months in between. Writes lock the month of the day they change; the
+# ETag covers every month, so If-Match still means "nothing changed".
+def days_response(partition):
+    start = query.day_key(request.args.get("start") or "")
+    end = query.day_key(request.args.get("end") or "")
+    days, version = partition.load(start, end)
+    return list_response(None, days, version, select=lambda: query.select_days(days, request.args),
+                         modified=partition.modified(start, end))
+
 @app.route('/logs', methods=['GET'])
 def get_logs():
-    return jsonify(load_json(LOG_FILE, {}))
+    return days_response(logs)
 
 @app.route('/logs', methods=['POST'])
 def add_log():
-    try:
-        data = request.json
-        date = data.get("date")
-        if not date:
-            return jsonify({"error": "Date is required"}), 400
-
-        logs = load_json(LOG_FILE, {})
+    data = request.get_json(silent=True) or {}
+    date = data.get("date")
+    if not query.is_day(date):
+        return jsonify({"error": "date (YYYY-MM-DD) is required"}), 400
+
+    with logs.lock(date):
+        if stale(logs.version()):
+            return precondition_failed()
         entry = {
             "title": data.get("title", ""),
             "content": data.get("content", ""),
             "timestamp": data.get("timestamp", "")
         }
-
-        logs.setdefault(date, []).append(entry)
-        save_json(LOG_FILE, logs)
-        return jsonify({"message": "Log added"}), 201
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        logs.set(date, logs.get(date, []) + [entry])
+        return with_etag((jsonify({"message": "Log added"}), 201), logs.version())
 
 @app.route('/logs/<date>/<int:index>', methods=['DELETE'])
 def delete_log(date, index):
-    logs = load_json(LOG_FILE, {})
-    if date in logs and 0 <= index < len(logs[date]):
-        logs[date].pop(index)
-        if not logs[date]:
-            del logs[date]
-        save_json(LOG_FILE, logs)
-        return jsonify({"message": "Log deleted"}), 200
-    return jsonify({"error": "Log not found"}), 404
-from uuid import uuid4
-# === NOTES ROUTES ===
-@app.route('/notes', methods=['GET'])
-def get_notes():
-    notes = load_json(NOTE_FILE, [])
-    for note in notes:
-        date_str = note.get("date") or note.get("created_at", "")
-        date_obj = None
-
-        if date_str:
-            try:
-                if "T" in date_str:
-                    date_obj = parse_datetime_safe(date_str)
-                else:
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            except Exception as e:
-                print("Note date parse error:", e)
-
-        if date_obj:
-            if date_obj.tzinfo is None:
-                date_obj = date_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                date_obj = date_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            note["prettyDate"] = format_pretty_date(date_obj)
-            note["prettyTime"] = format_pretty_time(date_obj)
+    with logs.lock(date):
+        if stale(logs.version()):
+            return precondition_failed()
+        entries = logs.get(date, [])
+        if not 0 <= index < len(entries):
+            return jsonify({"error": "Log not found"}), 404
+        remaining = entries[:index] + entries[index + 1:]
+        if remaining:
+            logs.set(date, remaining)
         else:
-            note["prettyDate"] = date_str
-            note["prettyTime"] = ""
-
-    return jsonify(notes)
-
-@app.route('/notes', methods=['POST'])
-def add_note():
-    notes = load_json(NOTE_FILE, [])
-    data = request.json
-
-    new_id = max([n.get("id", -1) for n in notes], default=-1) + 1
-
-    notes.append({
-        "id": new_id,
-        "title": data.get("title", ""),
-        "content": data.get("content", ""),
-        "date": data.get("date", ""),
-        "pinned": data.get("pinned", False),
-        "created_at": data.get("created_at", ""),
-        "tags": data.get("tags", []),
-        "notebook": data.get("notebook", "")
-    })
-    save_json(NOTE_FILE, notes)
-    return jsonify({"message": "Note added", "id": new_id}), 201
-
-@app.route('/notes/<int:note_id>', methods=['PUT'])
-def update_note(note_id):
-    notes = load_json(NOTE_FILE, [])
-    for note in notes:
-        if note.get("id") == note_id:
-            updated = request.json
-            note["title"] = updated.get("title", note["title"])
-            note["content"] = updated.get("content", note["content"])
-            note["pinned"] = updated.get("pinned", note.get("pinned", False))
-            note["modified_at"] = updated.get("modified_at", note.get("modified_at", ""))
-            note["tags"] = updated.get("tags", note.get("tags", []))
-            note["notebook"] = updated.get("notebook", note.get("notebook", ""))
-            save_json(NOTE_FILE, notes)
-            return jsonify({"message": "Note updated"}), 200
-    return jsonify({"error": "Note not found"}), 404
-
-@app.route('/notes/<int:note_id>', methods=['DELETE'])
-def delete_note(note_id):
-    notes = load_json(NOTE_FILE, [])
-    updated_notes = [note for note in notes if note.get("id") != note_id]
-    if len(updated_notes) < len(notes):
-        save_json(NOTE_FILE, updated_notes)
-        return jsonify({"message": "Note deleted"}), 200
-    return jsonify({"error": "Note not found"}), 404
-
-
+            logs.delete(date)
+        return with_etag((jsonify({"message": "Log deleted"}), 200), logs.version())
 
 # === REFLECTIONS ===
 @app.route('/reflections', methods=['GET'])
 def get_reflections():
-    return jsonify(load_json(REFLECTIONS_FILE, {}))
+    return days_response(reflections)
 
 @app.route('/reflections', methods=['POST'])
 def save_reflections():
-    data = request.json
+    data = request.get_json(silent=True) or {}
     week = data.get("week")  # e.g., "2025-07-14"
-    if not week:
-        return jsonify({"error": "Week is required"}), 400
-
-    reflections = load_json(REFLECTIONS_FILE, {})
-    reflections[week] = {
-        "what_went_well": data.get("what_went_well", ""),
-        "what_to_improve": data.get("what_to_improve", "")
-    }
-
-    save_json(REFLECTIONS_FILE, reflections)
-    return jsonify({"message": "Reflection saved"}), 201
+    if not query.is_day(week):
+        return jsonify({"error": "week (YYYY-MM-DD) is required"}), 400
+
+    with reflections.lock(week):
+        if stale(reflections.version()):
+            return precondition_failed()
+        reflections.set(week, {
+            "what_went_well": data.get("what_went_well", ""),
+            "what_to_improve": data.get("what_to_improve", "")
+        })
+        return with_etag((jsonify({"message": "Reflection saved"}), 201), reflections.version())
+
+# === FOCUS ===
+# One focus line per day, partitioned by month like logs.
+# GET /focus?date=YYYY-MM-DD -> {"date", "focus"} or 404; without a date the
+# whole (or ?start=&end=) date-keyed dict.
+@app.route('/focus', methods=['GET'])
+def get_focus():
+    date = request.args.get("date")
+    if not date:
+        return days_response(focus)
+    entry = focus.get(date)
+    if entry is None:
+        return jsonify({"error": "No focus set for this date"}), 404
+    return jsonify({"date": date, **(entry if isinstance(entry, dict) else {"focus": entry})})
+
+@app.route('/focus', methods=['POST'])
+def save_focus():
+    data = request.get_json(silent=True) or {}
+    date = data.get("date")
+    text = data.get("focus")
+    if not query.is_day(date) or not isinstance(text, str) or not text.strip():
+        return jsonify({"error": "date (YYYY-MM-DD) and focus are required"}), 400
+
+    with focus.lock(date):
+        if stale(focus.version()):
+            return precondition_failed()
+        focus.set(date, {"focus": text.strip(), "updated_at": get_vegas_time().isoformat()})
+        return with_etag((jsonify({"message": "Focus saved"}), 201), focus.version())
+
+# === TIME ===
+# POST /time {date, minutes[, category, note]} logs a session, PUT/DELETE
+# /time/<id> edit one (generated, see RESOURCES). The reads below come from
+# time_totals and never scan the log:
+#   GET /time                 {"YYYY-MM-DD": {"minutes", "sessions"}} (?start=&end=)
+#   GET /time/summary?date=   that day, its week (with categories), its month
+#                             and all-time totals per category
+#   GET /time/entries         the raw sessions (list query params)
+@app.route('/time', methods=['GET'])
+def get_time():
+    start, end = request.args.get("start"), request.args.get("end")
+    if any(day and not query.is_day(day) for day in (start, end)):
+        return jsonify({"error": "start/end must be dates (YYYY-MM-DD)"}), 400
+    start, end = start or "", end or "9999"
+    return jsonify({day: total for day, total in time_totals.table("day").items() if start <= day <= end})
+
+@app.route('/time/summary', methods=['GET'])
+def get_time_summary():
+    day = request.args.get("date") or get_vegas_time().strftime("%Y-%m-%d")
+    if not query.is_day(day):
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    week = week_of(day)
+    return jsonify({
+        "date": day,
+        "day": time_totals.get("day", day),
+        "week": {"start": week, **time_totals.get("week", week),
+                 "categories": time_totals.table("week_category", week)},
+        "month": {"month": day[:7], **time_totals.get("month", day[:7])},
+        "categories": time_totals.table("category"),
+    })
 
-# === AI ROUTE ===
-@app.route('/ai', methods=['POST'])
-def ai_assistant():
+@app.route('/time/entries', methods=['GET'])
+def get_time_entries():
+    entries, version = store.load_versioned(TIME_FILE, [])
+    return list_response(TIME_FILE, entries, version)
+
+# === PLANNER ===
+# Everything the home/weekly/schedule pages need for a date window in one round
+# trip: GET /planner?start=YYYY-MM-DD&end=YYYY-MM-DD (defaults to this week).
+# All collections are read under their locks so the view is one consistent
+# snapshot. Dated items carry their list "index" for the index-based routes;
+# repeating schedule items come once per day they fall on in the window.
+PLANNER_MAX_DAYS = 400
+
+def planner_window():
+    """(start, end) from ?start=&end=, or None if they aren't a valid window."""
+    today = get_vegas_time().date()
+    week_start = today - timedelta(days=today.weekday())
+    start = query.day_key(request.args.get("start", week_start.isoformat()))
+    end = query.day_key(request.args["end"]) if request.args.get("end") else None
+    try:
+        first = datetime.strptime(start, "%Y-%m-%d")
+        last = datetime.strptime(end, "%Y-%m-%d") if end else first + timedelta(days=6)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= (last - first).days < PLANNER_MAX_DAYS:
+        return None
+    return first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d")
+
+def window_error():
+    return jsonify({"error": f"start/end must be dates (YYYY-MM-DD) with start <= end, "
+                             f"at most {PLANNER_MAX_DAYS} days apart"}), 400
+
+def schedule_window(records, version, start, end):
+    r = RESOURCES["schedule"]
+    return query.occurrences(r.filename, records, version, start, end, r.span_fn, recurrence.expand)
+
+@app.route('/planner', methods=['GET'])
+def get_planner():
+    window = planner_window()
+    if window is None:
+        return window_error()
+    start, end = window
+
+    dated = {"tasks": TASK_FILE, "goals": GOAL_FILE, "lessons": LESSON_FILE, "schedule": SCHEDULE_FILE}
+    # Reflections are keyed by week start, so include the week that overlaps
+    # the start of the window too
+    first_week = (datetime.strptime(start, "%Y-%m-%d") - timedelta(days=6)).strftime("%Y-%m-%d")
+    segments = [*logs.segments(start, end), *reflections.segments(first_week, end)]
+    # Only the snapshot is taken under the locks. Writes replace records
+    # rather than edit them, so shallow copies of the lists (the merged log and
+    # reflection dicts are new already) stay as they were, and the body is
+    # built and encoded after the locks are released.
+    with store.locked(*dated.values(), *segments):
+        snapshot = {}
+        for key, filename in dated.items():
+            records, version = store.load_versioned(filename, [])
+            snapshot[key] = list(records), version
+        snapshot["logs"] = logs.load(start, end)
+        snapshot["reflections"] = reflections.load(first_week, end)
+        modified = max((store.modified(f) or 0 for f in [*dated.values(), *segments]), default=0)
+    # The window is part of the tag: without ?start= it moves every week
+    # while the versions (and the request URL) stay the same
+    etag = "-".join([start, end, *(str(version) for _, version in snapshot.values())])
+    if "start" not in request.args:
+        modified = 0  # nor is Last-Modified a validator for "this week"
+
+    def build():
+        planner = {"start": start, "end": end}
+        for key, filename in dated.items():
+            records, version = snapshot[key]
+            if key == "schedule":
+                planner[key] = schedule_window(records, version, start, end)
+            else:
+                planner[key] = query.window(filename, records, version, start, end)
+        planner["logs"] = query.window_days(snapshot["logs"][0], start, end)
+        planner["reflections"] = query.window_days(snapshot["reflections"][0], first_week, end)
+        return planner, {}
+
+    return json_response(build, etag, modified or None)
+
+# === SEARCH ===
+# GET /search?q=words[&collections=notes,logs,lessons][&limit=N]: ranked
+# matches from notes (title, content, tags, notebook), logs (title, content)
+# and lessons (title, description, notes). Every word must match, as a
+# whole word or as a prefix.
+@app.route('/search', methods=['GET'])
+def search():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= 100:
+        return jsonify({"error": "limit must be between 1 and 100"}), 400
+    collections = [c for c in request.args.get("collections", "").split(",") if c]
+    if any(c not in search_index.collections for c in collections):
+        return jsonify({"error": f"collections must be among: {', '.join(search_index.collections)}"}), 400
+
+    return jsonify({"query": q, "results": search_index.search(q, collections, limit)})
+
+# === CHANGES ===
+# GET /changes?since=<seq>[&limit=N] returns what changed after `seq`, oldest
+# first. Without `since` it only returns the current last_seq to start from.
+# 410 means the history was trimmed past `since`: refetch, then resume from
+# the returned last_seq.
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    try:
+        since = int(request.args["since"]) if "since" in request.args else None
+        limit = int(request.args.get("limit", 500))
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+    if limit <= 0:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    if since is None:
+        return jsonify({"changes": [], "last_seq": change_log.last_seq, "has_more": False})
     try:
-        data = request.json
-        prompt = data.get("prompt", "").strip()
-        if not prompt:
-            return jsonify({"error": "Prompt is required"}), 400
+        changes, last_seq = change_log.since(since, min(limit, 5000))
+    except ChangesGone:
+        return jsonify({"error": "Changes since this seq are no longer available",
+                        "reset": True, "last_seq": change_log.last_seq}), 410
+    has_more = bool(changes) and changes[-1]["seq"] < last_seq
+    return jsonify({"changes": changes, "last_seq": last_seq, "has_more": has_more})
+
+# === STREAM ===
+# Server-Sent Events: GET /stream pushes each task/goal/note/lesson change
+# (same shape as /changes) as an event whose id is its seq, so a reconnecting
+# EventSource resumes from Last-Event-ID by itself. If the history it asks for
+# was trimmed it gets a "reset" event and should refetch. Each stream holds a
+# worker thread, so it ends after STREAM_MAX_SECONDS and the browser
+# reconnects; run gunicorn with threaded (gthread) or async workers.
+STREAM_COLLECTIONS = {"tasks", "goals", "notes", "lessons"}
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", "300"))
+STREAM_HEARTBEAT = 15
+
+def sse(event, data, seq=None):
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    resume = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        seq = int(resume) if resume else change_log.last_seq
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be a seq number"}), 400
+    wanted = set(request.args.get("collections", "").split(",")) & STREAM_COLLECTIONS or STREAM_COLLECTIONS
+
+    def events(seq):
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        yield "retry: 3000\n" + sse("ready", {"last_seq": seq}, seq)
+        while time.monotonic() < deadline:
+            try:
+                changes, last_seq = change_log.since(seq)
+            except ChangesGone:
+                seq = change_log.last_seq
+                yield sse("reset", {"last_seq": seq}, seq)
+                continue
+            for change in changes:
+                if change["collection"] in wanted:
+                    yield sse("change", change, change["seq"])
+            if changes:
+                seq = changes[-1]["seq"]
+                if seq < last_seq:
+                    continue
+            change_log.wait(seq, min(STREAM_HEARTBEAT, max(deadline - time.monotonic(), 0)))
+            if change_log.last_seq == seq:
+                yield ": keep-alive\n\n"
+
+    response = Response(events(seq), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
-        system_message = """
+# === AI ROUTE ===
+# POST /ai only queues the prompt and answers 202 with a job id; the model
+# call (with timeout and retries) and the writes happen on the job pool.
+# Poll GET /ai/jobs/<id> until status is "done" (result holds the old /ai
+# response body) or "failed". A repeated prompt can come back "done" at once.
+AI_SYSTEM_MESSAGE = """
 You are a helpful productivity assistant.
 When the user provides a message, return a structured JSON object with these keys:
 - tasks: list of task objects (title, notes, date, completed)
 - goals: list of goal objects (title, notes, completed)
 - lessons: list of lesson objects (title, description, category, date, priority, notes, completed)
-- schedule: list of scheduled items (title, date, time, notes)
+- schedule: list of scheduled items (title, date, time, notes, repeat). repeat is only for
+  recurring items: "daily", "weekdays", "weekly", "monthly", "yearly" or an RRULE such as
+  "FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20261231"; date is then the first occurrence.
 
 Only include keys that apply. Use today's date only if no date is implied. Respond ONLY with valid JSON — no explanation.
         """
+def run_ai_job(payload):
+    client, retry_on = ai_client()
+
+    def call_model():
+        with metrics.timer("openai_request_seconds"):
+            return client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": AI_SYSTEM_MESSAGE},
+                    {"role": "user", "content": payload["prompt"]}
+                ],
+                timeout=ai_jobs.AI_TIMEOUT
+            )
+
+    response, attempts = ai_jobs.with_retries(call_model, retry_on)
+
+    parsed = json.loads(response.choices[0].message.content.strip())
+
+    today = get_vegas_time().strftime('%Y-%m-%d')
+
+    for task in parsed.get("tasks", []):
+        task["completed"] = task.get("completed", False)
+        task["text"] = task.get("text", task.get("title", ""))
+        task["date"] = task.get("date") or today
+        task["id"] = new_id()
+        normalize(task)
+
+    for goal in parsed.get("goals", []):
+        goal["completed"] = goal.get("completed", False)
+        goal["id"] = new_id()
+        normalize(goal)
+
+    for lesson in parsed.get("lessons", []):
+        lesson["completed"] = lesson.get("completed", False)
+        lesson["id"] = new_id()
+        normalize(lesson)
+
+    for item in parsed.get("schedule", []):
+        item["date"] = item.get("date") or today
+        item["id"] = new_id()
+        if recurrence.check(item):
+            item.pop("repeat", None)  # not a rule we can expand: keep it as a one-off
+        normalize(item)
+
+    # Written under all four locks, so no reader sees some of the results and
+    # not the rest. Each collection gets one store.batch(): a single journal
+    # record (one transaction with SQLite). The store has no transaction that
+    # spans collections, so a crash between two of them can still leave the
+    # earlier ones written.
+    results = {TASK_FILE: "tasks", GOAL_FILE: "goals", LESSON_FILE: "lessons", SCHEDULE_FILE: "schedule"}
+    with store.locked(*results):
+        for filename, key in results.items():
+            if parsed.get(key):
+                store.batch(filename, [{"op": "extend", "values": parsed[key]}])
+
+    parts = []
+    if parsed.get("tasks"): parts.append(f"{len(parsed['tasks'])} task{'s' if len(parsed['tasks']) != 1 else ''}")
+    if parsed.get("goals"): parts.append(f"{len(parsed['goals'])} goal{'s' if len(parsed['goals']) != 1 else ''}")
+    if parsed.get("lessons"): parts.append(f"{len(parsed['lessons'])} lesson{'s' if len(parsed['lessons']) != 1 else ''}")
+    if parsed.get("schedule"): parts.append(f"{len(parsed['schedule'])} schedule item{'s' if len(parsed['schedule']) != 1 else ''}")
+
+    if parts:
+        message = f"All set! I added {', '.join(parts)} to your planner."
+    else:
+        message = "I didn't find anything to add. Try giving me a task, goal, or lesson to help you plan."
+
+    return {
+        "response": message,
+        "tasks": parsed.get("tasks", []),
+        "goals": parsed.get("goals", []),
+        "lessons": parsed.get("lessons", []),
+        "schedule": parsed.get("schedule", []),
+        "attempts": attempts
+    }
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        parsed = json.loads(response.choices[0].message.content.strip())
-
-        vegas = ZoneInfo("America/Los_Angeles")
-        today = datetime.now(vegas).strftime('%Y-%m-%d')
-
-        tasks = load_json(TASK_FILE, [])
-        for task in parsed.get("tasks", []):
-            task["completed"] = task.get("completed", False)
-            task["text"] = task.get("text", task.get("title", ""))
-            task["date"] = task.get("date") or today
-            tasks.append(task)
-        save_json(TASK_FILE, tasks)
-
-        goals = load_json(GOAL_FILE, [])
-        for goal in parsed.get("goals", []):
-            goal["completed"] = goal.get("completed", False)
-            goals.append(goal)
-        save_json(GOAL_FILE, goals)
-
-        lessons = load_json(LESSON_FILE, [])
-        for lesson in parsed.get("lessons", []):
-            lesson["completed"] = lesson.get("completed", False)
-            lessons.append(lesson)
-        save_json(LESSON_FILE, lessons)
-
-        schedule = load_json(SCHEDULE_FILE, [])
-        for item in parsed.get("schedule", []):
-            item["date"] = item.get("date") or today
-            schedule.append(item)
-        save_json(SCHEDULE_FILE, schedule)
-
-        parts = []
-        if parsed.get("tasks"): parts.append(f"{len(parsed['tasks'])} task{'s' if len(parsed['tasks']) != 1 else ''}")
-        if parsed.get("goals"): parts.append(f"{len(parsed['goals'])} goal{'s' if len(parsed['goals']) != 1 else ''}")
-        if parsed.get("lessons"): parts.append(f"{len(parsed['lessons'])} lesson{'s' if len(parsed['lessons']) != 1 else ''}")
-        if parsed.get("schedule"): parts.append(f"{len(parsed['schedule'])} schedule item{'s' if len(parsed['schedule']) != 1 else ''}")
-
-        if parts:
-            message = f"All set! I added {', '.join(parts)} to your planner."
-        else:
-            message = "I didn't find anything to add. Try giving me a task, goal, or lesson to help you plan."
-
-        return jsonify({
-            "response": message,
-            "tasks": parsed.get("tasks", []),
-            "goals": parsed.get("goals", []),
-            "lessons": parsed.get("lessons", []),
-            "schedule": parsed.get("schedule", [])
-        })
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# === LESSONS ===
-@app.route('/lessons', methods=['GET'])
-def get_lessons():
-    lessons = load_json(LESSON_FILE, [])
-    for lesson in lessons:
-        # === Safe date parsing ===
-        date_str = lesson.get("date", "")
-        date_obj = None
-        if date_str:
-            try:
-                if "T" in date_str:
-                    date_obj = parse_datetime_safe(date_str)
-                else:
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            except Exception as e:
-                print("Lesson date parse error:", e)
-
-        # === Safe time parsing ===
-        time_str = lesson.get("time", "")
-        time_obj = None
-        if time_str:
-            try:
-                h, m = map(int, time_str.split(":"))
-                now_vegas = datetime.now(ZoneInfo("America/Los_Angeles"))
-                time_obj = now_vegas.replace(hour=h, minute=m, second=0, microsecond=0)
-            except Exception as e:
-                print("Lesson time parse error:", e)
-
-        # === Format date/time ===
-        if date_obj:
-            if date_obj.tzinfo is None:
-                date_obj = date_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                date_obj = date_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            lesson["prettyDate"] = format_pretty_date(date_obj)
-
-        if time_obj:
-            if time_obj.tzinfo is None:
-                time_obj = time_obj.replace(tzinfo=ZoneInfo("America/Los_Angeles"))
-            else:
-                time_obj = time_obj.astimezone(ZoneInfo("America/Los_Angeles"))
-            lesson["prettyTime"] = format_pretty_time(time_obj)
-
-    return jsonify(lessons)
-
-@app.route('/lessons', methods=['POST'])
-def add_lesson():
-    lessons = load_json(LESSON_FILE, [])
-    data = request.json
-    lessons.append({
-        "id": str(uuid.uuid4()),
-        "title": data.get("title", ""),
-        "description": data.get("description", ""),
-        "category": data.get("category", ""),
-        "date": data.get("date", ""),
-        "time": data.get("time", ""),  # time now supported
-        "priority": data.get("priority", ""),
-        "notes": data.get("notes", ""),
-        "completed": False
-    })
-    save_json(LESSON_FILE, lessons)
-    return jsonify({"message": "Lesson added"}), 201
-
-@app.route("/lessons/<string:lesson_id>", methods=["DELETE"])
-def delete_lesson(lesson_id):
-    lessons = load_json(LESSON_FILE, [])
-    updated_lessons = [lesson for lesson in lessons if lesson.get("id") != lesson_id]
-
-    if len(updated_lessons) == len(lessons):
-        return jsonify({"error": "Lesson not found"}), 404
-
-    save_json(LESSON_FILE, updated_lessons)
-    return jsonify({"message": "Lesson deleted"}), 200
-
-@app.route('/lessons/<string:lesson_id>', methods=['PUT'])
-def update_lesson(lesson_id):
-    lessons = load_json(LESSON_FILE, [])
-    updated_data = request.json
-
-    for i, lesson in enumerate(lessons):
-        if lesson.get("id") == lesson_id:
-            lessons[i] = {
-                **lesson,
-                **updated_data
-            }
-            save_json(LESSON_FILE, lessons)
-            return jsonify({"message": "Lesson updated"}), 200
-
-    return jsonify({"error": "Lesson not found"}), 404
+ai_queue = ai_jobs.JobQueue(store, AI_JOB_FILE, run_ai_job)
 
+@app.route('/ai', methods=['POST'])
+def ai_assistant():
+    data = request.get_json(silent=True) or {}
+    prompt = str(data.get("prompt", "")).strip()
+    if not prompt:
+        return jsonify({"error": "Prompt is required"}), 400
+
+    # Repeats of a prompt on the same day share one job (see ai_jobs.JobQueue)
+    key = ai_jobs.prompt_key(prompt, get_vegas_time().strftime('%Y-%m-%d'))
+    job, outcome = ai_queue.submit({"prompt": prompt}, key)
+    response = jsonify({**job, "job_id": job["id"], "status_url": f"/ai/jobs/{job['id']}"})
+    response.headers["Location"] = f"/ai/jobs/{job['id']}"
+    response.headers["X-AI-Cache"] = outcome
+    return response, 200 if job["status"] == "done" else 202
+
+@app.route('/ai/jobs/<job_id>', methods=['GET'])
+def get_ai_job(job_id):
+    job = ai_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/ai/cache', methods=['GET'])
+def get_ai_cache():
+    return jsonify(ai_queue.cache_info())
+
+# The stored items as they are, or with ?start=&end= (same rules as /planner)
+# every occurrence inside the window, repeating items expanded.
 @app.route('/schedule', methods=['GET'])
 def get_schedule():
-    return jsonify(load_json(SCHEDULE_FILE, []))
+    if "start" not in request.args and "end" not in request.args:
+        return collection_response(SCHEDULE_FILE, [])
+    window = planner_window()
+    if window is None:
+        return window_error()
+    records, version = store.load_versioned(SCHEDULE_FILE, [])
+    return json_response(lambda: (schedule_window(records, version, *window), {}), version,
+                         store.modified(SCHEDULE_FILE))
+
 # === COLLECTIONS ===
+# collections.json used to be opened relative to the working directory
+# instead of DATA_DIR. On the first start without one in DATA_DIR, a copy
+# left in the working directory is carried over (read through its journal).
+LEGACY_COLLECTIONS_FILE = "collections.json"
+
+def migrate_collections():
+    """Copy the working-directory collections into DATA_DIR; True if it did."""
+    legacy = os.path.abspath(LEGACY_COLLECTIONS_FILE)
+    if legacy == os.path.abspath(COLLECTIONS_FILE) or not os.path.exists(legacy):
+        return False
+    with store.lock(COLLECTIONS_FILE):
+        if load_json(COLLECTIONS_FILE, None) is not None:
+            return False
+        data = Store().load(legacy, {})
+        if not isinstance(data, dict) or not data:
+            return False
+        save_json(COLLECTIONS_FILE, data)
+        return True
+
+migrate_collections()
+
 @app.route('/collections', methods=['GET'])
 def get_collections():
-    return jsonify(load_json("collections.json", {}))
+    return collection_response(COLLECTIONS_FILE, {})
 
 @app.route('/collections', methods=['POST'])
+@locked(COLLECTIONS_FILE)
 def add_to_collection():
     data = request.json
     collection = data.get("collection")
@@ -578,40 +942,196 @@ def add_to_collection():
     if not collection or note_id is None:
         return jsonify({"error": "Missing data"}), 400
 
-    collections = load_json("collections.json", {})
-    if collection not in collections:
-        collections[collection] = []
-
-    if note_id not in collections[collection]:
-        collections[collection].append(note_id)
-
-    save_json("collections.json", collections)
+    collections = load_json(COLLECTIONS_FILE, {})
+    members = collections.get(collection, [])
+    if note_id not in members:
+        store.set(COLLECTIONS_FILE, collection, members + [note_id])
     return jsonify({"message": "Added to collection"}), 200
 
 @app.route('/collections/<collection_name>', methods=['DELETE'])
+@locked(COLLECTIONS_FILE)
 def delete_collection(collection_name):
-    collections = load_json("collections.json", {})
+    collections = load_json(COLLECTIONS_FILE, {})
     if collection_name in collections:
-        del collections[collection_name]
-        save_json("collections.json", collections)
+        store.delete(COLLECTIONS_FILE, collection_name)
         return jsonify({"message": f"Collection '{collection_name}' deleted"}), 200
     else:
         return jsonify({"error": "Collection not found"}), 404
 
 @app.route('/fix-notes', methods=['POST'])
+@locked(NOTE_FILE)
 def fix_notes_ids():
-    notes = load_json(NOTE_FILE, [])
-    changed = False
-    max_id = max([n.get("id", -1) for n in notes], default=-1)
-
-    for note in notes:
-        if "id" not in note:
-            max_id += 1
-            note["id"] = max_id
-            changed = True
-
-    if changed:
-        save_json(NOTE_FILE, notes)
+    # Ids are also assigned at startup, so this only finds notes written
+    # straight into the file since then
+    if assign_ids(NOTE_FILE, numeric=True):
         return jsonify({"message": "IDs fixed"}), 200
     else:
         return jsonify({"message": "All notes already have IDs"}), 200
+
+# === BATCH ===
+# POST /batch {"operations": [{"collection": "tasks", "op": "toggle", "index": 3}, ...]}
+# runs create/update/toggle/delete operations in order, all or nothing. Each
+# one is checked against a working copy of its collection first; only if all
+# of them succeed is each collection written, with a single store.batch()
+# (one journal record / one transaction). Items are addressed by "id", or by
+# "index": the position after the earlier operations in the batch. Ids are
+# looked up through the store's id index until an operation changes the
+# collection, then through an IdIndex of the working copy kept up to date
+# operation by operation. "if_match": {"tasks": "<etag>", ...} refuses with
+# 412 if a collection has changed. Every resource in RESOURCES can be batched.
+BATCH_MAX_OPERATIONS = 500
+
+class BatchError(Exception):
+    pass
+
+def batch_position(items, op, find):
+    """Position in `items` of the item `op` addresses; `find(id)` looks up ids."""
+    if "id" in op:
+        record_id = op["id"]
+        if isinstance(record_id, (str, int)) and not isinstance(record_id, bool):
+            index = find(record_id)
+            if index is not None:
+                return index
+    else:
+        index = op.get("index")
+        if isinstance(index, int) and not isinstance(index, bool) and 0 <= index < len(items):
+            return index
+    raise BatchError("Item not found")
+
+def batch_payload(op):
+    payload = op.get("data")
+    if not isinstance(payload, dict):
+        raise BatchError("data must be an object")
+    return payload
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    data = request.get_json(silent=True) or {}
+    operations = data.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_OPERATIONS} operations per batch"}), 400
+    if not all(isinstance(op, dict) and op.get("collection") in RESOURCES for op in operations):
+        return jsonify({"error": f"Each operation needs a collection: {', '.join(RESOURCES)}"}), 400
+
+    names = sorted({op["collection"] for op in operations})
+    files = {name: RESOURCES[name].filename for name in names}
+    with store.locked(*files.values()):
+        for name, etag in (data.get("if_match") or {}).items():
+            if name in files and str(etag).strip('"') != collection_etag(files[name]):
+                return jsonify({"error": "Data changed on the server, reload and try again", "collection": name}), 412
+
+        working = {name: list(load_json(filename, [])) for name, filename in files.items()}
+        records = {name: [] for name in names}
+        next_ids = {name: store.max_id(filename) + 1 for name, filename in files.items() if RESOURCES[name].int_ids}
+        ids = {}  # name -> IdIndex of the working copy once it has changed (None: build on next lookup)
+
+        def find(name, record_id):
+            if name not in ids:  # still the stored list
+                return store.find(files[name], "id", record_id)
+            if ids[name] is None:
+                ids[name] = IdIndex(working[name])
+            return ids[name].positions.get(record_id)
+
+        def stage(name, record):
+            # Queue `record` for the store; call before applying it to the working copy
+            index = ids.get(name)
+            ids[name] = index if index is not None and index.update(working[name], record) else None
+            records[name].append(record)
+
+        results = []
+        for op in operations:
+            name = op["collection"]
+            r = RESOURCES[name]
+            items = working[name]
+            find_id = partial(find, name)
+            try:
+                kind = op.get("op")
+                if kind == "create":
+                    item = r.new(batch_payload(op), next_ids.get(name))
+                    if error := r.check(item):
+                        raise BatchError(error)
+                    if r.int_ids:
+                        next_ids[name] += 1
+                    stage(name, {"op": "append", "value": item})
+                    items.append(item)
+                    index = len(items) - 1
+                elif kind in ("update", "toggle"):
+                    index = batch_position(items, op, find_id)
+                    if kind == "update":
+                        item = r.merge(items[index], batch_payload(op))
+                    elif not r.toggle:
+                        raise BatchError(f"{r.label}s can't be toggled")
+                    else:
+                        item = r.toggled(items[index])
+                    if error := r.check(item):
+                        raise BatchError(error)
+                    stage(name, {"op": "set", "key": index, "value": item})
+                    items[index] = item
+                elif kind == "delete":
+                    index = batch_position(items, op, find_id)
+                    stage(name, {"op": "delete", "key": index})
+                    item = items.pop(index)
+                else:
+                    raise BatchError("op must be create, update, toggle or delete")
+                results.append({"ok": True, "index": index, "item": item})
+            except BatchError as e:
+                results.append({"ok": False, "error": str(e)})
+
+        if not all(r["ok"] for r in results):
+            return jsonify({"applied": False, "results": results}), 400
+
+        for name in names:
+            store.batch(files[name], records[name])
+        etags = {name: collection_etag(filename) for name, filename in files.items()}
+    return jsonify({"applied": True, "results": results, "etags": etags}), 200
+
+# === METRICS ===
+# Counters and histograms summed over all live workers, plus a few gauges for
+# the worker that answered
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled (METRICS=0)"}), 404
+    parse_cache = parse_date.cache_info()
+    extra = [
+        ("body_cache_bytes", "gauge", "Bytes held by this worker's response body cache", body_cache.size),
+        ("date_parse_cache_hits", "gauge", "Date parse cache hits in this worker", parse_cache.hits),
+        ("date_parse_cache_misses", "gauge", "Date parse cache misses in this worker", parse_cache.misses),
+    ]
+    body = metrics.render(metrics.collect(METRICS_DIR), extra)
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+# === WARM-UP ===
+# WARMUP=1 primes this worker in a background thread as soon as the app is
+# imported (i.e. after gunicorn boots the worker): every collection is read,
+# the date indexes, search index and time totals are built, and the AI client
+# is created. WARMUP=data skips the AI client. Without it all of this happens
+# lazily, on the first request that needs each piece.
+WARMUP = os.environ.get("WARMUP", "0")
+
+def warm_up(include_ai=True):
+    started = time.perf_counter()
+    for r in RESOURCES.values():
+        records, version = store.load_versioned(r.filename, [])
+        if isinstance(records, list):
+            query.date_index(r.filename, records, version, r.day_fn, r.span_fn)
+    load_json(COLLECTIONS_FILE, None)
+    today = get_vegas_time().strftime("%Y-%m-%d")
+    for partition in (logs, reflections, focus):
+        partition.load(today[:7] + "-01", today)
+    search_index.search("warm up")
+    time_totals.get("day", today)
+    if include_ai:
+        ai_client()
+    print(f"Warm-up done in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+def _warm_up_in_background():
+    try:
+        warm_up(include_ai=WARMUP != "data")
+    except Exception as e:
+        print("Warm-up error:", e)
+
+if WARMUP != "0":
+    threading.Thread(target=_warm_up_in_background, name="warm-up", daemon=True).start()
@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+
+
+# === TEXT DELTAS ===
+# An edit of a text as a list of operations over it, in order:
+#   {"retain": n}   keep the next n characters
+#   {"delete": n}   drop the next n characters
+#   {"insert": s}   add s here
+# Whatever follows the last operation is kept. Offsets count UTF-16 code
+# units, the way JavaScript indexes strings, so the browser can build a delta
+# with plain string indexes (emoji take two).
+def revision(text):
+    """Short hash identifying one version of a text."""
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+
+
+def apply_delta(text, ops):
+    if not isinstance(ops, list):
+        raise ValueError("delta must be a list of operations")
+    units = text.encode("utf-16-le", "surrogatepass")
+    out = []
+    pos = 0
+    for op in ops:
+        if not isinstance(op, dict) or len(op) != 1:
+            raise ValueError(f"Invalid delta operation: {op!r}")
+        (kind, arg), = op.items()
+        if kind == "insert" and isinstance(arg, str):
+            out.append(arg.encode("utf-16-le", "surrogatepass"))
+        elif kind in ("retain", "delete") and isinstance(arg, int) and not isinstance(arg, bool) and arg >= 0:
+            end = pos + 2 * arg
+            if end > len(units):
+                raise ValueError("delta runs past the end of the text")
+            if kind == "retain":
+                out.append(units[pos:end])
+            pos = end
+        else:
+            raise ValueError(f"Invalid delta operation: {op!r}")
+    out.append(units[pos:])
+    try:
+        return b"".join(out).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise ValueError("delta splits a character in two")
+
+
+def rebase(base, value, current):
+    """`value`, an edit of `base`, moved onto `current`: the fields the edit
+    changed come from `value`, all others from `current`."""
+    moved = {**current, **{k: v for k, v in value.items() if k not in base or base[k] != v}}
+    for k in base.keys() - value.keys():
+        moved.pop(k, None)
+    return moved
+
+
+# === COALESCED WRITES ===
+# Saves of one record that arrive within `window` seconds of each other are
+# written once, with the last value, when the window closes. Each pending
+# value remembers the stored record it was built on (`base`). If that record
+# was replaced in the meantime, the pending value is rebased onto the new one
+# (see rebase()); a save that has been acknowledged is never dropped.
+#
+# The pending values live in this process only, so a window is only safe when
+# this process is the only one writing the collection; with several workers
+# the window must be 0 (every save written through).
+#
+# `lock()` is the collection lock. put() must be called holding it, and the
+# writes happen under it, so a save never sees a half-flushed state.
+class Coalescer:
+    def __init__(self, lock, write, window, rebase=rebase):
+        self.lock = lock
+        self.write = write  # fn(key, base, value), under lock(); rebases if base moved
+        self.window = window
+        self.rebase = rebase
+        self._pending = {}  # key -> [due, base, value]
+        self._wake = threading.Condition()
+        self._thread = None
+
+    def current(self, key, base):
+        """The value waiting to replace `base`, else `base` itself."""
+        with self._wake:
+            item = self._pending.get(key)
+            if item is None:
+                return base
+            if item[1] != base:
+                item[1], item[2] = base, self.rebase(item[1], item[2], base)
+            return item[2]
+
+    def put(self, key, base, value):
+        if self.window <= 0:
+            self.write(key, base, value)
+            return
+        with self._wake:
+            item = self._pending.get(key)
+            if item is not None:
+                item[1], item[2] = base, value  # `value` was built on current()
+            else:
+                self._pending[key] = [time.monotonic() + self.window, base, value]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="coalesced-writes", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def flush(self, due_only=False):
+        """Write what is pending (only what is due, with `due_only`)."""
+        if not self._pending:
+            return
+        with self.lock():
+            with self._wake:
+                now = time.monotonic()
+                keys = [k for k, item in self._pending.items() if not due_only or item[0] <= now]
+                items = [(k, self._pending.pop(k)) for k in keys]
+            for key, (_, base, value) in items:
+                try:
+                    self.write(key, base, value)
+                except Exception as e:
+                    print("Coalesced write error:", e)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._pending:
+                    self._wake.wait()
+                delay = min(item[0] for item in self._pending.values()) - time.monotonic()
+                if delay > 0:
+                    self._wake.wait(delay)
+                    continue
+            self.flush(due_only=True)
@@ -0,0 +1,566 @@
+"""Quick benchmarks for the backend.
+
+    python bench.py store            # per-request latency vs tasks.json size
+    python bench.py stress           # parallel writers across processes, checks nothing is lost
+    python bench.py routes           # every route at 1k/10k/100k records: p50/p99, req/s, memory
+    python bench.py mixed            # concurrent read/write mix for --duration seconds
+    python bench.py compare a.json b.json   # diff two --out files, exit 1 on regressions
+    python bench.py coldstart        # time to first byte from a cold gunicorn, first touch of each page
+    python bench.py imports          # import-time profile of app.py (python -X importtime)
+
+routes and mixed drive the real app through the Flask test client, or with
+--target gunicorn through a local gunicorn (gthread) on a free port. /ai runs
+against the fake OpenAI client. --out saves the results for compare.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def make_tasks(n):
+    return [{
+        "title": f"Task {i}",
+        "notes": "",
+        "date": "2025-07-%02d" % (i % 28 + 1),
+        "time": "09:30",
+        "completed": bool(i % 2),
+        "subtasks": []
+    } for i in range(n)]
+
+
+def setup_app(data_dir):
+    # app.py reads DATA_DIR at import time; the AI client is only made by the
+    # first /ai job, which needs an API key if it is the real one
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    return app_module
+
+
+def make_records(n):
+    """Synthetic data for every collection, with ids the scenarios can address."""
+    day = lambda i: "2025-07-%02d" % (i % 28 + 1)
+    return {
+        "tasks.json": [{**t, "id": f"t{i}"} for i, t in enumerate(make_tasks(n))],
+        "goals.json": [{"id": f"g{i}", "title": f"Goal {i}", "notes": "", "date": day(i), "time": "",
+                        "completed": False} for i in range(n)],
+        "notes.json": [{"id": i, "title": f"Note {i}", "content": f"meeting notes {i} about the planner",
+                        "date": day(i), "pinned": False, "created_at": "", "tags": ["work"], "notebook": ""}
+                       for i in range(n)],
+        "lessons.json": [{"id": f"l{i}", "title": f"Lesson {i}", "description": "chapter review", "category": "",
+                          "date": day(i), "time": "", "priority": "", "notes": "", "completed": False}
+                         for i in range(n)],
+        "schedule.json": [{"id": f"s{i}", "title": f"Block {i}", "date": day(i), "time": "10:00", "notes": "",
+                           "repeat": "weekly" if i % 10 == 0 else ""}
+                          for i in range(n)],
+        "time.json": [{"id": f"m{i}", "date": day(i), "minutes": 25, "category": "work" if i % 2 else "study"}
+                      for i in range(n)],
+        "logs.json": {"2025-%02d-%02d" % (i // 28 % 12 + 1, i % 28 + 1): [{"title": f"Log {i}", "content": "done",
+                                                                          "timestamp": ""}]
+                      for i in range(min(n, 12 * 28))},
+    }
+
+
+def timeit(fn, repeat):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_store(repeat):
+    data_dir = tempfile.mkdtemp(prefix="planner-bench-")
+    app_module = setup_app(data_dir)
+    client = app_module.app.test_client()
+
+    print(f"{'items':>8} {'json.load':>12} {'load_json':>12} {'PUT /tasks/0':>14} {'PATCH toggle':>14}")
+    for n in SIZES:
+        app_module.save_json(app_module.TASK_FILE, make_tasks(n))
+        app_module.store.invalidate()
+
+        def raw_parse():
+            with open(app_module.TASK_FILE) as f:
+                json.load(f)
+
+        raw = timeit(raw_parse, repeat)
+        cached = timeit(lambda: app_module.load_json(app_module.TASK_FILE, []), repeat)
+        put = timeit(lambda: client.put("/tasks/0", json={"notes": "x"}), repeat)
+        toggle = timeit(lambda: client.patch("/tasks/0/toggle"), repeat)
+        print(f"{n:>8} {raw:>10.3f}ms {cached:>10.3f}ms {put:>12.3f}ms {toggle:>12.3f}ms")
+
+
+def _stress_worker(data_dir, worker, threads, writes, increments):
+    app_module = setup_app(data_dir)
+
+    def run(thread):
+        client = app_module.app.test_client()
+        for i in range(writes):
+            r = client.post("/tasks", json={"title": f"w{worker}-{thread}-{i}"})
+            assert r.status_code == 201, r.status_code
+        # Optimistic read-modify-write of one shared counter
+        for _ in range(increments):
+            while True:
+                r = client.get("/goals")
+                counter = int(r.get_json()[0]["notes"])
+                r = client.put("/goals/0", json={"notes": str(counter + 1)},
+                               headers={"If-Match": r.headers["ETag"]})
+                if r.status_code == 200:
+                    break
+                assert r.status_code == 412, r.status_code
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+
+def _stress_seed(data_dir):
+    app_module = setup_app(data_dir)
+    app_module.save_json(app_module.GOAL_FILE, [{"title": "counter", "notes": "0", "completed": False}])
+    app_module.store.flush()
+
+
+def bench_stress(processes, threads, writes, increments):
+    data_dir = tempfile.mkdtemp(prefix="planner-stress-")
+    # Seed in a child so this process never opens the store before forking
+    seed = multiprocessing.Process(target=_stress_seed, args=(data_dir,))
+    seed.start()
+    seed.join()
+
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=_stress_worker, args=(data_dir, w, threads, writes, increments))
+               for w in range(processes)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    from store import open_store
+    check = open_store(data_dir)
+    tasks = check.load(os.path.join(data_dir, "tasks.json"), [])
+    counter = int(check.load(os.path.join(data_dir, "goals.json"), [])[0]["notes"])
+
+    writers = processes * threads
+    titles = {t["title"] for t in tasks}
+    print(f"{writers} writers in {elapsed:.1f}s")
+    print(f"tasks:   {len(tasks)} stored, {len(titles)} unique, {writers * writes} expected")
+    print(f"counter: {counter}, {writers * increments} expected")
+    if len(tasks) != writers * writes or len(titles) != len(tasks) or counter != writers * increments:
+        print("FAIL: writes were lost")
+        sys.exit(1)
+    if any(w.exitcode for w in workers):
+        print("FAIL: a worker crashed")
+        sys.exit(1)
+
+
+# === ROUTES / MIXED ===
+# Each size runs in its own data dir and its own process (or gunicorn), so
+# memory numbers aren't polluted by the previous size.
+class TestClientDriver:
+    def __init__(self, data_dir):
+        os.environ.setdefault("AI_CLIENT", "fake")
+        self.app_module = setup_app(data_dir)
+        self.client = self.app_module.app.test_client()
+        self.pids = [os.getpid()]
+
+    def request(self, method, path, body=None):
+        r = self.client.open(path, method=method, json=body)
+        r.get_data()
+        return r.status_code
+
+    def close(self):
+        pass
+
+
+class GunicornDriver:
+    def __init__(self, data_dir, workers, env=None, wait=True):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        env = {**os.environ, "DATA_DIR": data_dir, "AI_CLIENT": "fake", "OPENAI_API_KEY": "bench", **(env or {})}
+        self.started = time.perf_counter()
+        self.proc = subprocess.Popen(
+            ["gunicorn", "app:app", "-b", f"127.0.0.1:{self.port}", "--worker-class", "gthread",
+             "--workers", str(workers), "--threads", "8", "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        self._local = threading.local()
+        if wait:
+            self.wait_ready("/goals?limit=1")
+
+    def wait_ready(self, path, timeout=30):
+        """Retry `path` until it answers 200; seconds since the process was started."""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                if self.request("GET", path) == 200:
+                    return time.perf_counter() - self.started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("gunicorn did not start")
+
+    @property
+    def pids(self):
+        children = f"/proc/{self.proc.pid}/task/{self.proc.pid}/children"
+        try:
+            with open(children) as f:
+                return [self.proc.pid] + [int(p) for p in f.read().split()]
+        except OSError:
+            return [self.proc.pid]
+
+    def request(self, method, path, body=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            r = conn.getresponse()
+            r.read()
+        except (http.client.HTTPException, OSError):
+            self._local.conn = None
+            raise
+        return r.status
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def rss_mb(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            pass
+    return total / 2 ** 20
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def scenarios(n):
+    """(name, fn(i) -> (method, path, body)) for every collection."""
+    task = {"title": "bench", "date": "2025-07-10", "time": "08:00"}
+    return [
+        ("GET /tasks", lambda i: ("GET", "/tasks", None)),
+        ("GET /tasks?window", lambda i: ("GET", "/tasks?start=2025-07-01&end=2025-07-07&limit=50", None)),
+        ("POST /tasks", lambda i: ("POST", "/tasks", task)),
+        ("PUT /tasks/<id>", lambda i: ("PUT", f"/tasks/t{i % n}", {"notes": f"n{i}"})),
+        ("PATCH /tasks/<id>/toggle", lambda i: ("PATCH", f"/tasks/t{i % n}/toggle", None)),
+        ("DELETE /tasks/<id>", lambda i: ("DELETE", f"/tasks/t{n - 1 - i}", None)),
+        ("GET /goals", lambda i: ("GET", "/goals", None)),
+        ("POST /goals", lambda i: ("POST", "/goals", {"title": "bench"})),
+        ("PUT /goals/<id>", lambda i: ("PUT", f"/goals/g{i % n}", {"notes": f"n{i}"})),
+        ("PATCH /goals/<id>/toggle", lambda i: ("PATCH", f"/goals/g{i % n}/toggle", None)),
+        ("DELETE /goals/<id>", lambda i: ("DELETE", f"/goals/g{n - 1 - i}", None)),
+        ("GET /notes", lambda i: ("GET", "/notes", None)),
+        ("POST /notes", lambda i: ("POST", "/notes", {"title": "bench", "content": "text"})),
+        ("PUT /notes/<id>", lambda i: ("PUT", f"/notes/{i % n}", {"content": f"c{i}"})),
+        ("PATCH /notes/<id>", lambda i: ("PATCH", f"/notes/{i % n}", {"content": f"p{i}"})),
+        ("PATCH /notes/<id> (unchanged)", lambda i: ("PATCH", f"/notes/{i % n}", {"title": f"Note {i % n}"})),
+        ("DELETE /notes/<id>", lambda i: ("DELETE", f"/notes/{n - 1 - i}", None)),
+        ("GET /lessons", lambda i: ("GET", "/lessons", None)),
+        ("POST /lessons", lambda i: ("POST", "/lessons", {"title": "bench"})),
+        ("PUT /lessons/<id>", lambda i: ("PUT", f"/lessons/l{i % n}", {"notes": f"n{i}"})),
+        ("DELETE /lessons/<id>", lambda i: ("DELETE", f"/lessons/l{n - 1 - i}", None)),
+        ("GET /logs", lambda i: ("GET", "/logs", None)),
+        ("GET /logs?window", lambda i: ("GET", "/logs?start=2025-07-01&end=2025-07-07", None)),
+        ("POST /logs", lambda i: ("POST", "/logs", {"date": "2025-07-10", "title": f"l{i}"})),
+        ("GET /schedule", lambda i: ("GET", "/schedule", None)),
+        ("GET /schedule?window", lambda i: ("GET", "/schedule?start=2025-07-07&end=2025-07-13", None)),
+        ("GET /schedule?month", lambda i: ("GET", "/schedule?start=2025-07-01&end=2025-07-31", None)),
+        ("POST /schedule", lambda i: ("POST", "/schedule", {"title": "bench", "date": "2025-07-10",
+                                                           "repeat": "FREQ=WEEKLY;BYDAY=MO,WE"})),
+        ("POST /time", lambda i: ("POST", "/time", {"date": "2025-07-10", "minutes": 25, "category": "bench"})),
+        ("GET /time/summary", lambda i: ("GET", "/time/summary?date=2025-07-10", None)),
+        ("POST /focus", lambda i: ("POST", "/focus", {"date": "2025-07-10", "focus": f"bench {i}"})),
+        ("GET /focus?date", lambda i: ("GET", "/focus?date=2025-07-10", None)),
+        ("GET /planner", lambda i: ("GET", "/planner?start=2025-07-07", None)),
+        ("GET /search", lambda i: ("GET", "/search?q=meet", None)),
+        ("POST /ai", lambda i: ("POST", "/ai", {"prompt": f"bench task {i}"})),
+        ("POST /ai (repeat)", lambda i: ("POST", "/ai", {"prompt": "bench task 0"})),
+    ]
+
+
+def _seed(data_dir, n):
+    app_module = setup_app(data_dir)
+    for name, data in make_records(n).items():
+        app_module.save_json(os.path.join(data_dir, name), data)
+    app_module.store.flush()
+
+
+def seed(n):
+    data_dir = tempfile.mkdtemp(prefix=f"planner-bench-{n}-")
+    p = multiprocessing.Process(target=_seed, args=(data_dir, n))
+    p.start()
+    p.join()
+    return data_dir
+
+
+def open_driver(target, data_dir, workers):
+    return GunicornDriver(data_dir, workers) if target == "gunicorn" else TestClientDriver(data_dir)
+
+
+def _routes_size(target, n, repeat, workers, only, conn):
+    driver = open_driver(target, seed(n), workers)
+    results = {}
+    try:
+        for name, make in scenarios(n):
+            if only and only not in name:
+                continue
+            driver.request(*make(repeat))  # warm up (builds indexes, caches)
+            latencies = []
+            start = time.perf_counter()
+            for i in range(repeat):
+                method, path, body = make(i)
+                t = time.perf_counter()
+                status = driver.request(method, path, body)
+                latencies.append((time.perf_counter() - t) * 1000)
+                assert status < 400, f"{name}: {method} {path} -> {status}"
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            results[f"{n} {name}"] = {"p50_ms": percentile(latencies, 0.5), "p99_ms": percentile(latencies, 0.99),
+                                      "rps": repeat / elapsed, "rss_mb": rss_mb(driver.pids)}
+    finally:
+        driver.close()
+    conn.send(results)
+
+
+def print_results(results):
+    print(f"{'size scenario':<40} {'p50':>10} {'p99':>10} {'req/s':>10} {'rss':>9}")
+    for key, r in results.items():
+        print(f"{key:<40} {r['p50_ms']:>8.3f}ms {r['p99_ms']:>8.3f}ms {r['rps']:>10.1f} {r['rss_mb']:>7.1f}MB")
+
+
+def bench_routes(target, sizes, repeat, workers, only):
+    results = {}
+    for n in sizes:
+        # Fresh process per size; DELETE scenarios need at least `repeat` records
+        parent, child = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=_routes_size, args=(target, n, min(repeat, n - 1), workers, only, child))
+        p.start()
+        results.update(parent.recv())
+        p.join()
+    print_results(results)
+    return results
+
+
+def _mixed_run(target, n, threads, duration, read_ratio, workers, conn):
+    driver = open_driver(target, seed(n), workers)
+    reads = ["/tasks?start=2025-07-01&end=2025-07-07", "/notes?limit=50", "/planner?start=2025-07-07", "/goals"]
+    latencies = {"read": [], "write": []}
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def run(thread):
+        rng = random.Random(thread)
+        while time.perf_counter() < deadline:
+            if rng.random() < read_ratio:
+                kind, req = "read", ("GET", rng.choice(reads), None)
+            else:
+                kind, req = "write", rng.choice([
+                    ("POST", "/tasks", {"title": f"mixed {thread}"}),
+                    ("PATCH", f"/tasks/t{rng.randrange(n)}/toggle", None),
+                    ("PUT", f"/notes/{rng.randrange(n)}", {"content": "mixed"}),
+                ])
+            t = time.perf_counter()
+            try:
+                status = driver.request(*req)
+            except (http.client.HTTPException, OSError) as e:
+                errors.append(str(e))
+                continue
+            latencies[kind].append((time.perf_counter() - t) * 1000)
+            if status >= 400:
+                errors.append(f"{req[0]} {req[1]} -> {status}")
+
+    try:
+        pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        results = {}
+        for kind, values in latencies.items():
+            if values:
+                values.sort()
+                results[f"{n} mixed {kind}"] = {"p50_ms": percentile(values, 0.5), "p99_ms": percentile(values, 0.99),
+                                                "rps": len(values) / elapsed, "rss_mb": rss_mb(driver.pids)}
+    finally:
+        driver.close()
+    conn.send((results, errors[:10], len(errors)))
+
+
+def bench_mixed(target, sizes, threads, duration, read_ratio, workers):
+    results = {}
+    for n in sizes:
+        parent, child = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=_mixed_run,
+                                    args=(target, n, threads, duration, read_ratio, workers, child))
+        p.start()
+        size_results, errors, error_count = parent.recv()
+        p.join()
+        results.update(size_results)
+        if error_count:
+            print(f"{n}: {error_count} failed requests, e.g. {errors}")
+    print_results(results)
+    return results
+
+
+# === COLD START ===
+# What the first visitor after the host wakes an idle instance waits for: a
+# fresh gunicorn (one worker) is started on the seeded data, and we time the
+# first response from process start (connection refused is retried every
+# 5ms), then the first request to each page after that. AI_CLIENT is left
+# alone so the real client setup is part of startup.
+COLD_PATHS = ["/tasks", "/planner?start=2025-07-07", "/notes", "/logs", "/search?q=meet", "/time/summary"]
+
+def bench_coldstart(n, repeat, env):
+    data_dir = seed(n)
+    samples = {}
+    for _ in range(repeat):
+        driver = GunicornDriver(data_dir, 1, {"AI_CLIENT": "", **env}, wait=False)
+        try:
+            samples.setdefault("first byte", []).append(driver.wait_ready(COLD_PATHS[0]) * 1000)
+            for path in COLD_PATHS[1:]:
+                t = time.perf_counter()
+                driver.request("GET", path)
+                samples.setdefault(f"first {path.split('?')[0]}", []).append((time.perf_counter() - t) * 1000)
+            rss = rss_mb(driver.pids[1:])
+        finally:
+            driver.close()
+    results = {}
+    for name, values in samples.items():
+        values.sort()
+        results[f"{n} cold {name}"] = {"p50_ms": percentile(values, 0.5), "p99_ms": values[-1],
+                                       "rps": 0.0, "rss_mb": rss}
+    print_results(results)
+    return results
+
+
+def bench_imports(top):
+    """Slowest modules imported by `import app`, by cumulative time."""
+    env = {**os.environ, "DATA_DIR": tempfile.mkdtemp(prefix="planner-bench-imports-"), "OPENAI_API_KEY": "bench"}
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], capture_output=True,
+                          text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    total = (time.perf_counter() - start) * 1000
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        depth = (len(parts[2]) - len(parts[2].lstrip()) - 1) // 2
+        rows.append((int(parts[1]), int(parts[0]), depth, parts[2].strip()))
+    print(f"python -c 'import app': {total:.0f}ms wall")
+    print(f"{'module':<40} {'cumulative':>12} {'self':>10}")
+    for cumulative, own, depth, name in sorted((r for r in rows if r[2] <= 1), reverse=True)[:top]:
+        print(f"{'  ' * depth + name:<40} {cumulative / 1000:>10.1f}ms {own / 1000:>8.1f}ms")
+    if proc.returncode:
+        print(proc.stderr.splitlines()[-1])
+
+
+# === COMPARE ===
+def compare(base_path, new_path, threshold):
+    """Print changes between two --out files; True if anything regressed by
+    more than `threshold` (latency up or throughput down)."""
+    with open(base_path) as f:
+        base = json.load(f)["results"]
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    regressed = False
+    print(f"{'size scenario':<40} {'p50':>18} {'p99':>18} {'req/s':>18}")
+    for key in [k for k in base if k in new]:
+        b, n = base[key], new[key]
+        cells, flagged = [], False
+        for metric, worse_if_up in (("p50_ms", True), ("p99_ms", True), ("rps", False)):
+            change = (n[metric] - b[metric]) / b[metric] if b[metric] else 0.0
+            # Sub-0.05ms latency moves are noise, whatever the percentage
+            noise = worse_if_up and abs(n[metric] - b[metric]) < 0.05
+            bad = not noise and (change > threshold if worse_if_up else change < -threshold)
+            flagged |= bad
+            cells.append(f"{n[metric]:>9.2f} {change:>+6.0%}{'!' if bad else ' '}")
+        regressed |= flagged
+        print(f"{key:<40} {' '.join(cells)}")
+    missing = [k for k in base if k not in new]
+    if missing:
+        print(f"not in {new_path}: {', '.join(missing)}")
+    return regressed
+
+
+def save_results(path, suite, args, results):
+    meta = {"suite": suite, "target": args.target, "sizes": args.sizes, "repeat": args.repeat,
+            "backend": os.environ.get("STORAGE_BACKEND", "json"), "time": time.time()}
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("suite", choices=["store", "stress", "routes", "mixed", "compare", "coldstart", "imports"])
+    ap.add_argument("files", nargs="*", help="compare: base.json new.json")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--processes", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=50)
+    ap.add_argument("--writes", type=int, default=5)
+    ap.add_argument("--increments", type=int, default=2)
+    ap.add_argument("--target", choices=["client", "gunicorn"], default="client")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=SIZES)
+    ap.add_argument("--only", help="routes: only scenarios containing this text")
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--read-ratio", type=float, default=0.8)
+    ap.add_argument("--out", help="save results as JSON")
+    ap.add_argument("--env", action="append", default=[], help="coldstart: extra KEY=VALUE for gunicorn")
+    ap.add_argument("--threshold", type=float, default=0.2, help="compare: allowed relative slowdown")
+    args = ap.parse_args()
+
+    if args.suite == "store":
+        bench_store(args.repeat)
+    elif args.suite == "stress":
+        bench_stress(args.processes, args.threads, args.writes, args.increments)
+    elif args.suite == "imports":
+        bench_imports(args.repeat)
+    elif args.suite == "compare":
+        if len(args.files) != 2:
+            ap.error("compare needs two result files")
+        if compare(*args.files, args.threshold):
+            print(f"FAIL: regressions over {args.threshold:.0%}")
+            sys.exit(1)
+    else:
+        if args.suite == "routes":
+            results = bench_routes(args.target, args.sizes, args.repeat, args.workers, args.only)
+        elif args.suite == "coldstart":
+            env = dict(item.split("=", 1) for item in args.env)
+            results = {}
+            for n in args.sizes:
+                results.update(bench_coldstart(n, min(args.repeat, 10), env))
+        else:
+            threads = args.threads if args.threads != ap.get_default("threads") else 8
+            results = bench_mixed(args.target, args.sizes, threads, args.duration, args.read_ratio, args.workers)
+        if args.out:
+            save_results(args.out, args.suite, args, results)
+
+
+if __name__ == "__main__":
+    main()
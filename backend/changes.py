@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+
+from store import CollectionLock, _stat
+
+CHANGES_RETAIN = int(os.environ.get("CHANGES_RETAIN", "5000"))
+POLL_INTERVAL = float(os.environ.get("CHANGES_POLL_INTERVAL", "0.5"))
+
+
+class ChangesGone(Exception):
+    """The requested seq is older than the retained history; the client has to
+    refetch its collections and start again from the current last_seq."""
+
+
+# === CHANGE LOG ===
+# One append-only file of JSON lines shared by every gunicorn worker:
+#   {"seq": 12, "collection": "tasks", "op": "update", "key": 3, "value": {...}, "time": ...}
+# `seq` is allocated under an fcntl lock, so it is monotonic across processes.
+# `key` is what the store addresses the record by (list position or dict key),
+# so changes must be applied in order; "reset" means the whole collection was
+# replaced. Only the newest `retain` entries are kept once the file grows to
+# twice that.
+class ChangeLog:
+    def __init__(self, path, retain=CHANGES_RETAIN):
+        self.path = path
+        self.retain = max(retain, 1)
+        self._file_lock = CollectionLock(path + ".lock")
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._entries = []  # contiguous seqs starting at _first_seq
+        self._first_seq = 1
+        self._ino = None
+        self._pos = 0
+
+    @property
+    def last_seq(self):
+        with self._lock:
+            self._refresh()
+            return self._first_seq + len(self._entries) - 1
+
+    def record(self, collection, changes):
+        if not changes:
+            return
+        with self._file_lock, self._lock:
+            self._refresh()
+            if (st := _stat(self.path)) and st.st_size > self._pos:
+                os.truncate(self.path, self._pos)  # torn line from a crashed writer
+
+            seq = self._first_seq + len(self._entries)
+            now = time.time()
+            entries = []
+            for change in changes:
+                entries.append({"seq": seq, "collection": collection, **change, "time": now})
+                seq += 1
+            body = "".join(json.dumps(e) + "\n" for e in entries).encode()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, body)
+                if self._ino is None:
+                    self._ino = os.fstat(fd).st_ino
+            finally:
+                os.close(fd)
+            self._entries.extend(entries)
+            self._pos += len(body)
+            self._changed.notify_all()
+
+            if len(self._entries) > 2 * self.retain:
+                self._trim()
+
+    def since(self, seq, limit=500):
+        """(changes after `seq`, last_seq). Raises ChangesGone if some of them
+        were already trimmed away, or if `seq` is from a log that no longer exists."""
+        with self._lock:
+            self._refresh()
+            last_seq = self._first_seq + len(self._entries) - 1
+            if seq < self._first_seq - 1 or seq > last_seq:
+                raise ChangesGone(seq)
+            start = seq - self._first_seq + 1
+            return self._entries[start:start + limit], last_seq
+
+    def wait(self, seq, timeout):
+        """Block until there is something after `seq` or `timeout` passes.
+        Writes from this process wake waiters at once; other workers' writes
+        are picked up by re-reading the file every POLL_INTERVAL."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                self._refresh()
+                remaining = deadline - time.monotonic()
+                if self._first_seq + len(self._entries) - 1 != seq or remaining <= 0:
+                    return
+                self._changed.wait(min(remaining, POLL_INTERVAL))
+
+    def _refresh(self):
+        st = _stat(self.path)
+        if st is None:
+            self._entries, self._first_seq, self._ino, self._pos = [], 1, None, 0
+            return
+        if st.st_ino != self._ino or st.st_size < self._pos:
+            self._entries, self._ino, self._pos = [], st.st_ino, 0
+        if st.st_size == self._pos:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._pos)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1  # leave a half-written last line for later
+        for line in chunk[:end].splitlines():
+            entry = json.loads(line)
+            if not self._entries:
+                self._first_seq = entry["seq"]
+            self._entries.append(entry)
+        self._pos += end
+
+    def _trim(self):
+        keep = self._entries[-self.retain:]
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in keep).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._entries, self._first_seq = keep, keep[0]["seq"]
+        self._ino, self._pos = st.st_ino, st.st_size
@@ -0,0 +1,87 @@
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from metrics import timed
+
+VEGAS = ZoneInfo("America/Los_Angeles")
+
+
+# === DATE NORMALIZATION ===
+# prettyDate/prettyTime are worked out once when a record is written (or when
+# its file is first loaded) and stored on the record, so GETs only serialize.
+# Parsing is memoized on the raw strings: planner data reuses the same handful
+# of dates and times over and over.
+def format_pretty_date(dt_obj):
+    return dt_obj.strftime("%B %-d, %Y").replace(" 0", " ")
+
+def format_pretty_time(dt_obj):
+    return dt_obj.strftime("%-I:%M %p").lower()
+
+def _parse_iso(date_str):
+    try:
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        # Anything fromisoformat can't read goes to dateutil, imported only
+        # if such a date ever turns up (it isn't needed for a cold start)
+        from dateutil import parser
+        return parser.parse(date_str)
+
+@lru_cache(maxsize=8192)
+@timed("date_parse_seconds")
+def parse_date(date_str):
+    """Vegas-local datetime for a 'YYYY-MM-DD' or ISO string, or None."""
+    try:
+        if "T" in date_str:
+            dt_obj = _parse_iso(date_str)
+        else:
+            dt_obj = datetime.strptime(date_str, "%Y-%m-%d")
+    except (ValueError, OverflowError) as e:
+        print("Date parse error:", e)
+        return None
+
+    if dt_obj.tzinfo is None:
+        return dt_obj.replace(tzinfo=VEGAS)
+    return dt_obj.astimezone(VEGAS)
+
+@lru_cache(maxsize=8192)
+def pretty_date(date_str):
+    dt_obj = parse_date(date_str)
+    return format_pretty_date(dt_obj) if dt_obj else None
+
+@lru_cache(maxsize=2048)
+@timed("date_parse_seconds")
+def pretty_time(time_str):
+    """'14:05' -> '2:05 pm', or None if it isn't HH:MM."""
+    try:
+        h, m = map(int, time_str.split(":"))
+        return format_pretty_time(datetime(2000, 1, 1, h, m))
+    except ValueError as e:
+        print("Time parse error:", e)
+        return None
+
+def _set_or_drop(record, key, value):
+    if value is None:
+        record.pop(key, None)
+    else:
+        record[key] = value
+
+def normalize(record):
+    """Tasks, goals, lessons: prettyDate from `date`, prettyTime from `time`."""
+    date_str = record.get("date")
+    time_str = record.get("time")
+    _set_or_drop(record, "prettyDate", pretty_date(date_str) if date_str and isinstance(date_str, str) else None)
+    _set_or_drop(record, "prettyTime", pretty_time(time_str) if time_str and isinstance(time_str, str) else None)
+    return record
+
+def normalize_note(note):
+    """Notes fall back to created_at and take both fields from one timestamp."""
+    date_str = note.get("date") or note.get("created_at", "")
+    dt_obj = parse_date(date_str) if date_str and isinstance(date_str, str) else None
+    if dt_obj:
+        note["prettyDate"] = format_pretty_date(dt_obj)
+        note["prettyTime"] = format_pretty_time(dt_obj)
+    else:
+        note["prettyDate"] = date_str
+        note["prettyTime"] = ""
+    return note
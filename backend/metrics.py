@@ -0,0 +1,239 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+ENABLED = os.environ.get("METRICS", "1") != "0"
+LOG = os.environ.get("METRICS_LOG") == "1"  # one JSON line per request on stdout
+FLUSH_INTERVAL = 1.0
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Request latency by route", LATENCY_BUCKETS),
+    "http_response_bytes_total": ("counter", "Response body bytes by route", None),
+    "storage_seconds": ("histogram", "Time in store calls by operation and collection", LATENCY_BUCKETS),
+    "date_parse_seconds": ("histogram", "Time parsing dates and times (cache misses only)", LATENCY_BUCKETS),
+    "openai_request_seconds": ("histogram", "Time in OpenAI chat completion calls", LATENCY_BUCKETS),
+}
+
+
+# === REGISTRY ===
+# Plain dicts under one lock: a histogram is [bucket counts..., sum, count].
+# The lock is re-entrant because a streamed body's finalizer (_counting) can
+# run from garbage collection while this thread is already inside it.
+# Each gunicorn worker keeps its own and writes it to METRICS_DIR/<pid>.json
+# at most once a second; /metrics adds up the files of live workers, so any
+# worker can answer the scrape.
+class Registry:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.values = {}  # (name, labels) -> histogram list or counter float
+        self.dirty = False
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.values.get(key)
+            if h is None:
+                h = self.values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+            self.dirty = True
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self.dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            self.dirty = False
+            return [[name, list(labels), value[:] if isinstance(value, list) else value]
+                    for (name, labels), value in self.values.items()]
+
+registry = Registry()
+_local = threading.local()
+
+
+def _add_time(kind, seconds):
+    spent = getattr(_local, "spent", None)
+    if spent is not None:
+        spent[kind] = spent.get(kind, 0) + seconds
+
+@contextmanager
+def timer(name, **labels):
+    """Time a block into histogram `name`; a no-op when metrics are off."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(name, elapsed, **labels)
+        _add_time(name, elapsed)
+
+def timed(name):
+    """Decorator form of timer()."""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_store(store, ops=("load", "load_versioned", "find", "max_id", "append", "extend",
+                                 "set", "delete", "batch", "save")):
+    """Wrap the store's methods so every call lands in storage_seconds."""
+    if not ENABLED:
+        return
+    for op in ops:
+        method = getattr(store, op)
+
+        def wrapper(filename, *args, _method=method, _op=op, **kwargs):
+            with timer("storage_seconds", op=_op, collection=os.path.basename(filename)):
+                return _method(filename, *args, **kwargs)
+        setattr(store, op, wrapper)
+
+
+# === FLASK HOOKS ===
+def init_app(app, metrics_dir):
+    if not ENABLED:
+        return
+    state = {"last_flush": 0.0, "lock": threading.Lock()}
+
+    @app.before_request
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        _local.spent = {}
+
+    @app.after_request
+    def finish_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        registry.observe("http_request_duration_seconds", elapsed,
+                         route=route, method=request.method, status=str(response.status_code))
+        if response.is_streamed:
+            response.response = _counting(response.response, route)
+        else:
+            registry.inc("http_response_bytes_total", response.calculate_content_length() or 0, route=route)
+        if LOG:
+            spent = getattr(_local, "spent", {})
+            print(json.dumps({"route": route, "method": request.method, "status": response.status_code,
+                              "ms": round(elapsed * 1000, 3), "bytes": response.calculate_content_length(),
+                              **{f"{k.replace('_seconds', '')}_ms": round(v * 1000, 3) for k, v in spent.items()}}),
+                  flush=True)
+        _local.spent = None
+        _maybe_flush(metrics_dir, state)
+        return response
+
+def _counting(chunks, route):
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        registry.inc("http_response_bytes_total", total, route=route)
+
+def _maybe_flush(metrics_dir, state):
+    now = time.monotonic()
+    if not registry.dirty or now - state["last_flush"] < FLUSH_INTERVAL or not state["lock"].acquire(False):
+        return
+    try:
+        state["last_flush"] = now
+        flush(metrics_dir)
+    finally:
+        state["lock"].release()
+
+def flush(metrics_dir):
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + ".tmp", path)
+
+
+# === EXPOSITION ===
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def collect(metrics_dir):
+    """This worker's values plus the last flush of every other live worker."""
+    flush(metrics_dir)
+    merged = {}
+    for name in os.listdir(metrics_dir):
+        if not name.endswith(".json"):
+            continue
+        pid = int(name[:-5]) if name[:-5].isdigit() else None
+        path = os.path.join(metrics_dir, name)
+        if pid is None or not _alive(pid):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, value in entries:
+            key = (metric, tuple(tuple(l) for l in labels))
+            if isinstance(value, list):
+                current = merged.setdefault(key, [0] * len(value))
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render(values, extra=()):
+    """Prometheus text exposition; `extra` is (name, type, help, value) gauges."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, v) for (n, labels), v in values.items() if n == name)
+        if not series:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, value in series:
+            if kind == "histogram":
+                for bound, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    for name, kind, help_text, value in extra:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
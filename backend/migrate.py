@@ -0,0 +1,57 @@
+"""One-shot migration of the JSON data files into the SQLite backend.
+
+    DATA_DIR=/mnt/data python migrate.py [--db /mnt/data/planner.db]
+
+Any pending journal records are replayed before copying. The JSON files are
+left untouched, so switching STORAGE_BACKEND back to json is always possible.
+Every collection the app keeps in DATA_DIR is listed in COLLECTIONS (note
+collections and AI jobs included); a missing file is skipped.
+Month segments of logs, reflections and focus (logs-2025-07.json, logs-manifest.json)
+are copied too; archived months stay in DATA_DIR/archive either way.
+"""
+import argparse
+import os
+import re
+
+from sqlite_store import SqliteStore
+from store import Store
+
+COLLECTIONS = {
+    "tasks.json": [],
+    "goals.json": [],
+    "logs.json": {},
+    "notes.json": [],
+    "focus.json": {},
+    "lessons.json": [],
+    "schedule.json": [],
+    "time.json": [],
+    "reflections.json": {},
+    "collections.json": {},
+    "ai_jobs.json": {},
+}
+SEGMENTS = re.compile(r"(logs|reflections|focus)-(\d{4}-\d{2}|undated|manifest)\.json$")
+
+
+def migrate(data_dir, db_path):
+    source = Store()
+    target = SqliteStore(db_path)
+    segments = sorted(name for name in os.listdir(data_dir) if SEGMENTS.match(name))
+    for name, default in [*COLLECTIONS.items(), *((name, {}) for name in segments)]:
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            continue
+        data = source.load(path, default)
+        target.save(path, data)
+        print(f"{name}: {len(data)} records")
+
+
+def main():
+    data_dir = os.environ.get("DATA_DIR", "/mnt/data")
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=os.path.join(data_dir, "planner.db"))
+    args = ap.parse_args()
+    migrate(data_dir, args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import gzip
+import json
+import os
+import re
+import threading
+import time
+
+_MONTH = re.compile(r"\d{4}-\d{2}$")
+UNDATED = "undated"  # keys that aren't dates (legacy data) share one segment
+
+
+# === PARTITIONED COLLECTIONS ===
+# A dict collection keyed by date ("YYYY-MM-DD": logs by day, reflections by
+# week start) kept as one store collection per month: logs-2025-07.json,
+# logs-2025-08.json... plus logs-manifest.json, which maps each month to
+# {"days": n, "archived": bool}. A write only touches its month's segment (and
+# the manifest when a day appears or disappears), and a date-range read only
+# loads the months it overlaps, so neither grows with the years of history.
+#
+# Old months can be archived: the segment is written to
+# archive/logs-2024-01.json.gz and emptied in the store. Archived months are
+# still readable (decompressed on demand); writing to one restores it first.
+#
+# Locks are taken segment first, then manifest (never through store.locked(),
+# which orders by name). Callers hold lock(key) around a read-modify-write of
+# one day, like any other collection.
+class Partitioned:
+    def __init__(self, store, data_dir, name):
+        self.store = store
+        self.data_dir = data_dir
+        self.name = name
+        self.manifest = os.path.join(data_dir, f"{name}-manifest.json")
+        self.archive_dir = os.path.join(data_dir, "archive")
+        self._segment_name = re.compile(rf"{re.escape(name)}-(\d{{4}}-\d{{2}}|{UNDATED})\.json$")
+        self._archived = {}  # month -> (mtime, data)
+        self._archived_lock = threading.Lock()
+
+    # --- layout ---
+    def month(self, key):
+        return key[:7] if isinstance(key, str) and _MONTH.match(key[:7]) else UNDATED
+
+    def segment(self, month):
+        return os.path.join(self.data_dir, f"{self.name}-{month}.json")
+
+    def archive_path(self, month):
+        return os.path.join(self.archive_dir, f"{self.name}-{month}.json.gz")
+
+    def owns(self, filename):
+        """True for this collection's segment files (not the manifest)."""
+        return os.path.dirname(filename) == self.data_dir and bool(self._segment_name.match(os.path.basename(filename)))
+
+    def months(self, start=None, end=None, manifest=None):
+        """Months with data that overlap [start, end] (days, inclusive), from
+        `manifest` if the caller already read it."""
+        if manifest is None:
+            manifest = self.store.load(self.manifest, {})
+        months = sorted(m for m, info in manifest.items() if info.get("days"))
+        if start is None and end is None:
+            return months
+        return [m for m in months if m != UNDATED and (not start or m >= start[:7]) and (not end or m <= end[:7])]
+
+    def segments(self, start=None, end=None):
+        return [self.segment(m) for m in self.months(start, end)]
+
+    # --- reading ---
+    def load(self, start=None, end=None):
+        """(days inside [start, end] as one dict, version). No bounds means everything."""
+        manifest, manifest_version = self.store.load_versioned(self.manifest, {})
+        days = {}
+        versions = [str(manifest_version)]
+        for month in self.months(start, end, manifest):
+            if manifest[month].get("archived"):
+                data = self._load_archived(month)
+            else:
+                data, version = self.store.load_versioned(self.segment(month), {})
+                versions.append(str(version))
+            if start or end:
+                data = {k: v for k, v in data.items() if (not start or k >= start) and (not end or k <= end)}
+            days.update(data)
+        return days, ".".join(versions)
+
+    def version(self, start=None, end=None):
+        """The version load() would return, without merging anything."""
+        manifest, manifest_version = self.store.load_versioned(self.manifest, {})
+        return ".".join([str(manifest_version)] + [str(self.store.version(self.segment(m)))
+                                                   for m in self.months(start, end, manifest)
+                                                   if not manifest[m].get("archived")])
+
+    def get(self, key, default=None):
+        if self.store.load(self.manifest, {}).get(self.month(key), {}).get("archived"):
+            return self._load_archived(self.month(key)).get(key, default)
+        return self.store.load(self.segment(self.month(key)), {}).get(key, default)
+
+    def modified(self, start=None, end=None):
+        times = [t for t in (self.store.modified(f) for f in [self.manifest, *self.segments(start, end)]) if t]
+        return max(times) if times else None
+
+    def _load_archived(self, month):
+        path = self.archive_path(month)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return {}
+        with self._archived_lock:
+            cached = self._archived.get(month)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        with self._archived_lock:
+            self._archived[month] = (mtime, data)
+        return data
+
+    # --- writing (under lock(key)) ---
+    def lock(self, key):
+        return self.store.lock(self.segment(self.month(key)))
+
+    def set(self, key, value):
+        month = self.month(key)
+        filename = self.segment(month)
+        with self.store.lock(self.manifest):
+            info = self.store.load(self.manifest, {}).get(month)
+            if info and info.get("archived"):
+                self._restore(month)
+            added = key not in self.store.load(filename, {})
+            self.store.set(filename, key, value)
+            if added or info is None:
+                self._recount(month)
+
+    def delete(self, key):
+        month = self.month(key)
+        filename = self.segment(month)
+        with self.store.lock(self.manifest):
+            info = self.store.load(self.manifest, {}).get(month)
+            if info and info.get("archived"):
+                self._restore(month)
+            if key in self.store.load(filename, {}):
+                self.store.delete(filename, key)
+                self._recount(month)
+
+    def _recount(self, month):
+        days = len(self.store.load(self.segment(month), {}))
+        self.store.set(self.manifest, month, {"days": days, "archived": False})
+
+    def _restore(self, month):
+        data = self._load_archived(month)
+        self.store.save(self.segment(month), data)
+        self.store.set(self.manifest, month, {"days": len(data), "archived": False})
+        os.remove(self.archive_path(month))
+        with self._archived_lock:
+            self._archived.pop(month, None)
+
+    # --- maintenance ---
+    def migrate(self, legacy_file):
+        """Move the days of the old single-file collection into segments, then
+        empty it (a gzipped copy is kept in the archive directory). Days that
+        already have a segment entry are left alone. Returns how many moved."""
+        if not self.store.load(legacy_file, {}):
+            return 0
+        with self.store.lock(legacy_file):
+            legacy = self.store.load(legacy_file, {})
+            if not isinstance(legacy, dict) or not legacy:
+                return 0
+            os.makedirs(self.archive_dir, exist_ok=True)
+            with gzip.open(os.path.join(self.archive_dir, f"{self.name}-legacy-{int(time.time())}.json.gz"), "wt") as f:
+                json.dump(legacy, f)
+
+            by_month = {}
+            for key, value in legacy.items():
+                by_month.setdefault(self.month(key), {})[key] = value
+            moved = 0
+            for month, days in sorted(by_month.items()):
+                with self.store.lock(self.segment(month)), self.store.lock(self.manifest):
+                    existing = self.store.load(self.segment(month), {})
+                    missing = {k: v for k, v in days.items() if k not in existing}
+                    if missing:
+                        self.store.batch(self.segment(month),
+                                         [{"op": "set", "key": k, "value": v} for k, v in missing.items()])
+                        moved += len(missing)
+                        self._recount(month)
+            self.store.save(legacy_file, {})
+            return moved
+
+    def archive(self, before):
+        """Compress every month before `before` ("YYYY-MM") out of the store.
+        Returns the months archived."""
+        archived = []
+        for month in self.months():
+            if month == UNDATED or month >= before:
+                continue
+            with self.store.lock(self.segment(month)), self.store.lock(self.manifest):
+                info = self.store.load(self.manifest, {}).get(month, {})
+                if info.get("archived") or not info.get("days"):
+                    continue
+                data = self.store.load(self.segment(month), {})
+                os.makedirs(self.archive_dir, exist_ok=True)
+                path = self.archive_path(month)
+                with gzip.open(path + ".tmp", "wt") as f:
+                    json.dump(data, f)
+                os.replace(path + ".tmp", path)
+                self.store.set(self.manifest, month, {"days": len(data), "archived": True})
+                self.store.save(self.segment(month), {})
+                archived.append(month)
+        return archived
@@ -0,0 +1,267 @@
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from dates import parse_date
+
+# Query-string parameters understood by the list endpoints. A request with
+# none of them gets the full collection, exactly as before.
+PARAMS = {"start", "end", "completed", "tag", "notebook", "limit", "cursor", "fields"}
+
+
+# === DAY KEYS ===
+def day_key(date_str):
+    """'YYYY-MM-DD' (Vegas-local) for a stored date string, or None."""
+    if not date_str or not isinstance(date_str, str):
+        return None
+    if len(date_str) == 10 and date_str[4] == "-" and date_str[7] == "-":
+        return date_str
+    dt_obj = parse_date(date_str)
+    return dt_obj.date().isoformat() if dt_obj else None
+
+def is_day(value):
+    """True for a real calendar day written as 'YYYY-MM-DD'."""
+    if not isinstance(value, str) or len(value) != 10:
+        return False
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+def record_day(record):
+    return day_key(record.get("date")) if isinstance(record, dict) else None
+
+def note_day(note):
+    return day_key(note.get("date") or note.get("created_at")) if isinstance(note, dict) else None
+
+
+# === DATE INDEX ===
+# Sorted (day, position) pairs for one version of a collection. Rebuilt lazily
+# on the first ranged query after a write; a date window is then two bisects
+# and only touches the records inside it.
+#
+# Built with a span_fn instead (record -> (first day, last day)), it doubles as
+# an interval index: records covering one day go in the pairs as usual, the
+# ones covering several (repeating schedule items) in `spans`, sorted by first
+# day, with a balanced tree laid over them that keeps the latest last day of
+# each subtree. spanning() skips every subtree that ends before the window, so
+# a week costs the same however many years the spans stretch over.
+class DateIndex:
+    def __init__(self, records, day_fn=None, span_fn=None):
+        self.spans = []  # (first day, position, last day)
+        if span_fn is None:
+            self.pairs = sorted((day, i) for i, r in enumerate(records) if (day := day_fn(r)))
+            return
+        self.pairs = []
+        for i, r in enumerate(records):
+            span = span_fn(r)
+            if span is None:
+                continue
+            if span[0] == span[1]:
+                self.pairs.append((span[0], i))
+            else:
+                self.spans.append((span[0], i, span[1]))
+        self.pairs.sort()
+        self.spans.sort()
+        self._max_end = [""] * len(self.spans)
+        self._augment(0, len(self.spans))
+
+    def _augment(self, lo, hi):
+        # The subtree over spans[lo:hi] is rooted at its middle
+        if lo >= hi:
+            return ""
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self.spans[mid][2], self._augment(lo, mid), self._augment(mid + 1, hi))
+        return self._max_end[mid]
+
+    def scan(self, start=None, end=None, after=None):
+        lo = bisect_left(self.pairs, (start, -1)) if start else 0
+        hi = bisect_right(self.pairs, (end, float("inf"))) if end else len(self.pairs)
+        if after:
+            lo = max(lo, bisect_right(self.pairs, tuple(after)))
+        return self.pairs[lo:hi]
+
+    def spanning(self, start, end):
+        """Positions of the several-day records overlapping [start, end], by first day."""
+        found = []
+        self._overlap(0, len(self.spans), start, end, found)
+        return found
+
+    def _overlap(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] < start:
+            return
+        self._overlap(lo, mid, start, end, found)
+        first, i, last = self.spans[mid]
+        if first > end:
+            return
+        if last >= start:
+            found.append(i)
+        self._overlap(mid + 1, hi, start, end, found)
+
+_indexes = {}  # filename -> (version, DateIndex)
+_indexes_lock = threading.Lock()
+
+def date_index(filename, records, version, day_fn, span_fn=None):
+    with _indexes_lock:
+        cached = _indexes.get(filename)
+        if cached and cached[0] == version:
+            return cached[1]
+    index = DateIndex(records, day_fn, span_fn)
+    with _indexes_lock:
+        _indexes[filename] = (version, index)
+    return index
+
+
+def window(filename, records, version, start, end, day_fn=record_day):
+    """Records dated inside [start, end], in date order, tagged with their list index."""
+    index = date_index(filename, records, version, day_fn)
+    return [{**records[i], "index": i} for _, i in index.scan(start, end)]
+
+def occurrences(filename, records, version, start, end, span_fn, expand):
+    """window() for records that can cover many days (repeating schedule items):
+    the interval index finds the ones overlapping [start, end] and
+    `expand(record, start, end)` gives their (day, copy) pairs. In date order."""
+    index = date_index(filename, records, version, None, span_fn)
+    found = [(day, i, records[i]) for day, i in index.scan(start, end)]
+    found += [(day, i, item) for i in index.spanning(start, end) for day, item in expand(records[i], start, end)]
+    found.sort(key=lambda f: f[:2])
+    return [{**item, "index": i} for _, i, item in found]
+
+def window_days(days, start, end):
+    """Entries of a date-keyed dict (logs, reflections) whose key is inside [start, end]."""
+    if not isinstance(days, dict):
+        return {}
+    return {k: days[k] for k in sorted(days) if day_key(k) and start <= k <= end}
+
+
+# === CURSORS ===
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+# === QUERY ===
+class Page:
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+def _parse_args(args):
+    opts = {
+        "start": day_key(args.get("start")) if args.get("start") else None,
+        "end": day_key(args.get("end")) if args.get("end") else None,
+        "completed": None,
+        "tag": args.get("tag"),
+        "notebook": args.get("notebook"),
+        "limit": None,
+        "cursor": decode_cursor(args["cursor"]) if args.get("cursor") else None,
+        "fields": [f for f in args.get("fields", "").split(",") if f] or None,
+    }
+    if args.get("start") and not opts["start"] or args.get("end") and not opts["end"]:
+        raise ValueError("start/end must be dates (YYYY-MM-DD)")
+    if "completed" in args:
+        value = args["completed"].lower()
+        if value not in ("true", "false", "1", "0"):
+            raise ValueError("completed must be true or false")
+        opts["completed"] = value in ("true", "1")
+    if "limit" in args:
+        try:
+            opts["limit"] = int(args["limit"])
+        except ValueError:
+            opts["limit"] = 0
+        if opts["limit"] <= 0:
+            raise ValueError("limit must be a positive integer")
+    return opts
+
+def _matches(record, opts):
+    if not isinstance(record, dict):
+        return False
+    if opts["completed"] is not None and bool(record.get("completed", False)) != opts["completed"]:
+        return False
+    if opts["tag"] is not None and opts["tag"] not in (record.get("tags") or []):
+        return False
+    if opts["notebook"] is not None and record.get("notebook", "") != opts["notebook"]:
+        return False
+    return True
+
+def _project(record, fields):
+    if fields is None or not isinstance(record, dict):
+        return record
+    return {f: record[f] for f in fields if f in record}
+
+def _take(candidates, limit, fields):
+    """First `limit` of (key, record) candidates, plus the cursor for the rest."""
+    items = []
+    last_key = None
+    for key, record in candidates:
+        if limit is not None and len(items) == limit:
+            return Page(items, encode_cursor(last_key))
+        items.append(_project(record, fields))
+        last_key = key
+    return Page(items)
+
+def _is_key(cursor, *types):
+    return (isinstance(cursor, list) and len(cursor) == len(types)
+            and all(isinstance(c, t) and not isinstance(c, bool) for c, t in zip(cursor, types)))
+
+def select(filename, records, version, args, day_fn=record_day):
+    """Filter/paginate/project a list collection, or None if no query was asked for."""
+    if not PARAMS.intersection(args):
+        return None
+    opts = _parse_args(args)
+
+    cursor = opts["cursor"]
+    if opts["start"] or opts["end"]:
+        # Date window: walk the index, results come back in date order
+        if cursor is not None and not _is_key(cursor, str, int):
+            raise ValueError("Invalid cursor")
+        index = date_index(filename, records, version, day_fn)
+        pairs = index.scan(opts["start"], opts["end"], cursor)
+        candidates = (([day, i], records[i]) for day, i in pairs)
+    else:
+        if cursor is not None and not _is_key(cursor, int):
+            raise ValueError("Invalid cursor")
+        first = cursor[0] + 1 if cursor else 0
+        candidates = (([i], records[i]) for i in range(first, len(records)))
+
+    candidates = ((key, r) for key, r in candidates if _matches(r, opts))
+    return _take(candidates, opts["limit"], opts["fields"])
+
+def select_days(days, args):
+    """Same query parameters for date-keyed dicts (logs, reflections, focus):
+    filters on the keys; fields= projects each entry (or each day's record)."""
+    if not PARAMS.intersection(args):
+        return None
+    opts = _parse_args(args)
+
+    keys = sorted(k for k in days if day_key(k))
+    lo = bisect_left(keys, opts["start"]) if opts["start"] else 0
+    hi = bisect_right(keys, opts["end"]) if opts["end"] else len(keys)
+    if opts["cursor"] is not None:
+        if not _is_key(opts["cursor"], str):
+            raise ValueError("Invalid cursor")
+        lo = max(lo, bisect_right(keys, opts["cursor"][0]))
+
+    result = {}
+    for key in keys[lo:hi]:
+        if opts["limit"] is not None and len(result) == opts["limit"]:
+            return Page(result, encode_cursor([prev]))
+        value = days[key]
+        # Logs keep a list of entries per day, reflections and focus one record
+        if isinstance(value, list):
+            result[key] = [_project(e, opts["fields"]) for e in value]
+        else:
+            result[key] = _project(value, opts["fields"])
+        prev = key
+    return Page(result)
@@ -0,0 +1,243 @@
+import calendar
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+
+import query
+from dates import parse_date, pretty_date
+
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+SHORTHANDS = {
+    "daily": "FREQ=DAILY",
+    "weekdays": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "weekly": "FREQ=WEEKLY",
+    "monthly": "FREQ=MONTHLY",
+    "yearly": "FREQ=YEARLY",
+}
+OPEN_END = "9999-12-31"  # last day of a rule with neither UNTIL nor COUNT
+MAX_COUNT = 5000
+
+
+# === RULES ===
+# A schedule item repeats when its "repeat" field holds a rule: one of the
+# SHORTHANDS, or an RRULE subset (RFC 5545) such as
+#   FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231
+# FREQ is DAILY/WEEKLY/MONTHLY/YEARLY, with INTERVAL, UNTIL or COUNT, and BYDAY
+# (plain weekdays) for WEEKLY. The item's "date" is where the series starts;
+# a monthly rule keeps its day of the month and skips months without it.
+#
+# Nothing is ever materialized: between() jumps straight to the period
+# containing the window and only walks the occurrences inside it, so the cost
+# of a week or a month doesn't depend on how long the series has been going.
+class Rule:
+    def __init__(self, freq, interval=1, byday=None, until=None, count=None):
+        self.freq = freq
+        self.interval = interval
+        self.byday = byday  # sorted weekday numbers (Monday = 0), WEEKLY only
+        self.until = until
+        self.count = count
+
+    def last(self, first):
+        """Day of the final occurrence of a series starting on `first`, OPEN_END
+        if it never ends, None if it has no occurrence at all."""
+        if self.count:
+            days = list(islice(self._from(first, first), self.count))
+            last = days[-1].isoformat() if days else None
+            if last and self.until and last > self.until.isoformat():
+                last = self.until.isoformat()
+        elif self.until:
+            last = self.until.isoformat()
+        else:
+            last = OPEN_END
+        if last is None or last < first.isoformat():
+            return None
+        return last
+
+    def between(self, first, start, end, last):
+        """Occurrences (dates) inside [start, end]; `last` as returned by last()."""
+        end = min(end, date.fromisoformat(last))
+        for day in self._from(first, max(first, start)):
+            if day > end:
+                return
+            yield day
+
+    def _from(self, first, day):
+        # Every occurrence on or after `day`, ignoring UNTIL and COUNT
+        try:
+            yield from getattr(self, "_" + self.freq.lower())(first, day)
+        except (OverflowError, ValueError):
+            return  # ran past year 9999
+
+    def _daily(self, first, day):
+        k = max(0, -(-(day - first).days // self.interval))
+        current = first + timedelta(days=k * self.interval)
+        while True:
+            yield current
+            current += timedelta(days=self.interval)
+
+    def _weekly(self, first, day):
+        byday = self.byday or (first.weekday(),)
+        week = first - timedelta(days=first.weekday())
+        skip = max(0, (day - week).days // 7) // self.interval * self.interval
+        week += timedelta(weeks=skip)
+        while True:
+            for weekday in byday:
+                current = week + timedelta(days=weekday)
+                if current >= first and current >= day:
+                    yield current
+            week += timedelta(weeks=self.interval)
+
+    def _monthly(self, first, day):
+        months = (day.year - first.year) * 12 + day.month - first.month
+        k = max(0, months) // self.interval * self.interval
+        while True:
+            year, month = divmod(first.month - 1 + k, 12)
+            year += first.year
+            if first.day <= calendar.monthrange(year, month + 1)[1]:
+                current = date(year, month + 1, first.day)
+                if current >= day:
+                    yield current
+            k += self.interval
+
+    def _yearly(self, first, day):
+        k = max(0, day.year - first.year) // self.interval * self.interval
+        while True:
+            year = first.year + k
+            if first.month != 2 or first.day != 29 or calendar.isleap(year):
+                current = first.replace(year=year)
+                if current >= day:
+                    yield current
+            k += self.interval
+
+
+def _positive_int(key, value, limit=None):
+    if not value.isdigit() or int(value) < 1 or (limit and int(value) > limit):
+        raise ValueError(f"{key} must be a whole number from 1" + (f" to {limit}" if limit else ""))
+    return int(value)
+
+
+def _until(value):
+    digits = value.replace("-", "")[:8]
+    try:
+        return date(int(digits[:4]), int(digits[4:6]), int(digits[6:8]))
+    except ValueError:
+        raise ValueError("UNTIL must be a date (YYYYMMDD)")
+
+
+def parse(text):
+    """Rule for a "repeat" value; ValueError says what's wrong with it."""
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("repeat must be a rule like 'weekly' or 'FREQ=WEEKLY;BYDAY=MO,WE'")
+    return _parse(text.strip())
+
+
+@lru_cache(maxsize=1024)
+def _parse(text):
+    text = SHORTHANDS.get(text.lower(), text)
+    if text.upper().startswith("RRULE:"):
+        text = text[6:]
+    parts = {}
+    for part in text.split(";"):
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid rule part: {part!r}")
+        parts[key.strip().upper()] = value.strip().upper()
+
+    freq = parts.pop("FREQ", None)
+    if freq not in ("DAILY", "WEEKLY", "MONTHLY", "YEARLY"):
+        raise ValueError("FREQ must be DAILY, WEEKLY, MONTHLY or YEARLY")
+    interval = _positive_int("INTERVAL", parts.pop("INTERVAL", "1"))
+    byday = None
+    if "BYDAY" in parts:
+        days = parts.pop("BYDAY").split(",")
+        if freq != "WEEKLY" or not all(d in WEEKDAYS for d in days):
+            raise ValueError("BYDAY takes weekdays (MO,TU,...) and only with FREQ=WEEKLY")
+        byday = tuple(sorted({WEEKDAYS.index(d) for d in days}))
+    until = _until(parts.pop("UNTIL")) if "UNTIL" in parts else None
+    count = _positive_int("COUNT", parts.pop("COUNT"), MAX_COUNT) if "COUNT" in parts else None
+    if until and count:
+        raise ValueError("Use UNTIL or COUNT, not both")
+    if parts.pop("WKST", "MO") != "MO":
+        raise ValueError("Only WKST=MO is supported")
+    if parts:
+        raise ValueError(f"Unsupported rule part: {', '.join(sorted(parts))}")
+    return Rule(freq, interval, byday, until, count)
+
+
+@lru_cache(maxsize=4096)
+def _last(text, first):
+    # A COUNT rule walks its whole series to find the end, so keep the answer
+    return parse(text).last(date.fromisoformat(first))
+
+
+# === SCHEDULE ITEMS ===
+def check(item):
+    """Error message for a schedule item whose "repeat" can't be used, else None."""
+    if not item.get("repeat"):
+        return None
+    if not query.record_day(item):
+        return "A repeating item needs a date (YYYY-MM-DD) to start from"
+    try:
+        _, _, last = _series(item)
+    except ValueError as e:
+        return f"Invalid repeat: {e}"
+    if last is None:
+        return "Invalid repeat: rule produces no occurrences"
+    return None
+
+
+def _series(item):
+    # (rule, first day, last day) of a repeating item; ValueError if unusable
+    first = query.record_day(item)
+    rule = parse(item["repeat"])
+    return rule, first, _last(item["repeat"].strip(), first)
+
+
+def span(item):
+    """(first day, last day) an item covers, for the interval index; None if undated."""
+    first = query.record_day(item)
+    if not first:
+        return None
+    if not item.get("repeat"):
+        return first, first
+    try:
+        _, _, last = _series(item)
+    except ValueError:
+        return first, first  # unusable rule (written before validation): a one-off
+    return (first, last) if last else None
+
+
+def _on_day(value, day):
+    # The item's "date" moved to `day`, keeping the time of an ISO datetime.
+    # `day` is a Vegas day, so a time with an offset is moved in Vegas time
+    # and gets that day's offset back (DST may differ from the first one).
+    if len(value) == 10:
+        return day
+    try:
+        aware = datetime.fromisoformat(value).tzinfo is not None
+    except ValueError:
+        return day
+    if not aware:
+        return day + value[10:]
+    moved = date.fromisoformat(day)
+    return parse_date(value).replace(year=moved.year, month=moved.month, day=moved.day).isoformat()
+
+
+def expand(item, start, end):
+    """(day, item) for each time the item falls inside [start, end]. Copies of a
+    repeating item carry the series start as "first_date" and that day as
+    "date", with the time of day of the item's own date if it has one."""
+    first = query.record_day(item)
+    if not first:
+        return []
+    try:
+        rule, first, last = _series(item) if item.get("repeat") else (None, first, first)
+    except ValueError:
+        rule = None  # unusable rule: a one-off, like span()
+    if rule is None:
+        return [(first, item)] if start <= first <= end else []
+    if last is None:
+        return []
+    days = (day.isoformat() for day in rule.between(date.fromisoformat(first), date.fromisoformat(start),
+                                                     date.fromisoformat(end), last))
+    return [(day, {**item, "date": _on_day(item["date"], day), "prettyDate": pretty_date(day), "first_date": item["date"]}) for day in days]
@@ -0,0 +1,74 @@
+import copy
+import uuid
+
+import query
+from dates import normalize
+
+
+# === RESOURCES ===
+# A collection of records described once: which fields a new record gets (and
+# their defaults), how ids are made, which fields an update may change, how
+# prettyDate/prettyTime are derived and which day a record belongs to. app.py
+# generates the routes, id assignment, change tracking and /batch support for
+# every resource from this, so they all share one code path.
+class Resource:
+    def __init__(self, name, singular, filename, fields, ids="uuid", editable=None, initial=None,
+                 normalize=normalize, day_fn=query.record_day, by_index=False, validate=None, list_route=True,
+                 span_fn=None):
+        self.name = name  # URL prefix and change log / batch name
+        self.singular = singular  # endpoint names ("add_task") and messages
+        self.label = singular.replace("_", " ").capitalize()
+        self.filename = filename
+        self.fields = fields  # name -> default for new records
+        self.ids = ids  # "uuid", or "int" for the next integer (notes)
+        self.editable = editable  # fields an update takes; None takes anything
+        self.initial = initial or {}  # set on create whatever the client sends
+        self.normalize = normalize
+        self.day_fn = day_fn
+        self.span_fn = span_fn  # fn(record) -> (first day, last day), for records covering several days
+        self.by_index = by_index  # also serve the legacy /<name>/<int:index> routes
+        self.validate = validate  # fn(record) -> error message, or None if it may be stored
+        self.list_route = list_route  # False when app.py serves GET /<name> itself
+        self.toggle = "completed" in fields
+
+    @property
+    def int_ids(self):
+        return self.ids == "int"
+
+    def new(self, data, record_id=None):
+        """A record built from a POST body; `record_id` is required for int ids."""
+        record = {"id": record_id if self.int_ids else str(uuid.uuid4())}
+        for field, default in self.fields.items():
+            record[field] = data.get(field, copy.copy(default))
+        record.update(self.initial)
+        return self.normalize(record)
+
+    def merge(self, record, updated):
+        """`record` with an update applied; the id never changes."""
+        if self.editable is None:
+            merged = {**record, **updated}
+        else:
+            merged = dict(record)
+            for field in self.editable:
+                merged[field] = updated.get(field, record.get(field, copy.copy(self.fields.get(field, ""))))
+        if "id" in record:
+            merged["id"] = record["id"]
+        else:
+            merged.pop("id", None)
+        return self.normalize(merged)
+
+    def check(self, record):
+        """Error message for a record that can't be stored, else None."""
+        return self.validate(record) if self.validate else None
+
+    def toggled(self, record):
+        return {**record, "completed": not record.get("completed", False)}
+
+    def normalize_all(self, records):
+        """Fill in prettyDate/prettyTime where they're missing (records written
+        before they were stored). Every full load runs this, including the one at
+        startup, so records that already have them are skipped."""
+        for record in records:
+            if isinstance(record, dict) and "prettyDate" not in record:
+                self.normalize(record)
+
@@ -0,0 +1,185 @@
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+BODY_CACHE_BYTES = int(os.environ.get("BODY_CACHE_BYTES", str(16 * 1024 * 1024)))
+STREAM_MIN_ITEMS = int(os.environ.get("STREAM_MIN_ITEMS", "5000"))
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+# === BODY CACHE ===
+# Serialized (and compressed) GET bodies keyed by URL + collection version.
+# A version never changes content, so entries never go stale; they only fall
+# out when the cache is over its byte budget.
+class BodyCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # (path, etag) -> {"headers": {...}, encoding: bytes}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= self._weight(old)
+            self._entries[key] = entry
+            self.size += self._weight(entry)
+            while self.size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self._weight(evicted)
+
+    def add_encoding(self, key, entry, encoding, body):
+        with self._lock:
+            if self._entries.get(key) is entry and encoding not in entry:
+                entry[encoding] = body
+                self.size += len(body)
+
+    def _weight(self, entry):
+        return sum(len(v) for k, v in entry.items() if k != "headers")
+
+body_cache = BodyCache(BODY_CACHE_BYTES)
+
+
+def _compress(raw, encoding):
+    if encoding == "br":
+        return brotli.compress(raw, quality=5)
+    return gzip.compress(raw, compresslevel=6)
+
+def _pick_encoding():
+    offered = ["br", "gzip"] if brotli else ["gzip"]
+    return request.accept_encodings.best_match(offered) or "identity"
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return bool(since and last_modified and int(last_modified) <= since.timestamp())
+
+
+# === STREAMING ===
+# Large payloads are written out record by record instead of as one string:
+# only a shallow copy of the list (so concurrent writes can't shift it under
+# the generator) and one chunk of output are held at a time. The result is
+# the same JSON document, or NDJSON (one record per line; dict collections
+# give {"key": ..., "value": ...} lines) for clients that ask for it.
+def _wants_ndjson():
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+
+def _json_parts(payload, dumps):
+    if isinstance(payload, dict):
+        yield "{"
+        for i, (key, value) in enumerate(list(payload.items())):
+            yield ("," if i else "") + dumps(key) + ":" + dumps(value)
+        yield "}\n"
+    else:
+        yield "["
+        for i, item in enumerate(list(payload)):
+            yield ("," if i else "") + dumps(item)
+        yield "]\n"
+
+def _ndjson_parts(payload, dumps):
+    if isinstance(payload, dict):
+        for key, value in list(payload.items()):
+            yield dumps({"key": key, "value": value}) + "\n"
+    else:
+        for item in list(payload):
+            yield dumps(item) + "\n"
+
+def _chunks(parts):
+    buf, size = [], 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+def _stream(payload, headers, ndjson):
+    parts = _ndjson_parts if ndjson else _json_parts
+    chunks = _chunks(parts(payload, current_app.json.dumps))
+    gzip_ok = request.accept_encodings.best_match(["gzip"]) == "gzip"
+    response = Response(_gzip_chunks(chunks) if gzip_ok else chunks,
+                        mimetype="application/x-ndjson" if ndjson else "application/json")
+    response.headers.update(headers)
+    if gzip_ok:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+# === CONDITIONAL JSON RESPONSES ===
+def json_response(build, etag, last_modified=None):
+    """GET response for a versioned payload.
+
+    `build()` returns (payload, extra_headers) and is only called when the
+    body for this URL and version isn't cached yet. Clients that already have
+    this version get a 304. NDJSON requests (?format=ndjson or Accept:
+    application/x-ndjson), ?stream=1 and payloads of STREAM_MIN_ITEMS or more
+    records are streamed and not cached.
+    """
+    etag = str(etag)
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = _body_response(build, etag)
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+    response.vary.add("Accept-Encoding")
+    response.vary.add("Accept")
+    return response
+
+def _body_response(build, etag):
+    ndjson = _wants_ndjson()
+    key = (request.full_path, etag)
+    entry = None if ndjson else body_cache.get(key)
+    if entry is None:
+        payload, headers = build()
+        if ndjson or request.args.get("stream") == "1" or len(payload) >= STREAM_MIN_ITEMS:
+            return _stream(payload, headers, ndjson)
+        entry = {"headers": headers, "identity": (current_app.json.dumps(payload) + "\n").encode()}
+        body_cache.put(key, entry)
+
+    raw = entry["identity"]
+    encoding = _pick_encoding() if len(raw) >= COMPRESS_MIN_BYTES else "identity"
+    body = entry.get(encoding)
+    if body is None:
+        body = _compress(raw, encoding)
+        body_cache.add_encoding(key, entry, encoding, body)
+
+    response = Response(body, mimetype="application/json")
+    response.headers.update(entry["headers"])
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return response
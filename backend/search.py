@@ -0,0 +1,214 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from changes import ChangesGone
+
+# Field weights per collection; a term in a note title counts three times one
+# in its content
+FIELDS = {
+    "notes": {"title": 3, "tags": 2, "notebook": 1, "content": 1},
+    "lessons": {"title": 3, "description": 1, "notes": 1},
+    "logs": {"title": 3, "content": 1},
+}
+PREFIX_WEIGHT = 0.6  # a prefix match ("meet" -> "meeting") counts a bit less than the word itself
+PREFIX_EXPANSIONS = 50
+K1, B = 1.2, 0.75
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.casefold())
+
+def _field_text(value):
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return value if isinstance(value, str) else ""
+
+
+class _Doc:
+    __slots__ = ("collection", "key", "record", "terms", "length")
+
+    def __init__(self, collection, key, record):
+        self.collection = collection
+        self.key = key  # note/lesson id, or (date, position) for a log entry
+        self.record = record
+        self.terms = Counter()
+        for field, weight in FIELDS[collection].items():
+            for term in tokenize(_field_text(record.get(field))):
+                self.terms[term] += weight
+        self.length = sum(self.terms.values())
+
+
+# === SEARCH INDEX ===
+# Inverted index (term -> {doc: weighted count}) over notes, lessons and logs,
+# with a sorted vocabulary for prefix matching and BM25 ranking.
+#
+# It follows the change log rather than the store: every query first applies
+# the changes written since the last one (by any worker), so keeping it
+# current costs only the records that actually changed. For list collections
+# it mirrors the list order (doc per position) since change keys are
+# positions. If the change log has been trimmed past where it was, it is
+# rebuilt from the store.
+class SearchIndex:
+    def __init__(self, store, change_log, files, partitions=None):
+        self.store = store
+        self.change_log = change_log
+        self.files = files  # collection name -> filename
+        self.partitions = partitions or {}  # collection name -> Partitioned (logs)
+        self.collections = [*files, *self.partitions]
+        self._lock = threading.Lock()
+        self._seq = None  # last change applied; None until first built
+        self._next_doc = 0
+
+    def search(self, q, collections=None, limit=20):
+        terms = tokenize(q)
+        if not terms:
+            return []
+        with self._lock:
+            self._catch_up()
+            return self._rank(terms, collections or self.collections, limit)
+
+    # --- keeping up ---
+    def _catch_up(self):
+        if self._seq is None:
+            return self._rebuild()
+        while True:
+            try:
+                changes, last_seq = self.change_log.since(self._seq, 5000)
+            except ChangesGone:
+                return self._rebuild()
+            for change in changes:
+                if change["collection"] not in self.collections:
+                    continue
+                if change["op"] == "reset":
+                    # Whole collection (or month of logs) replaced: the store
+                    # is already past this point, so start over from it
+                    return self._rebuild()
+                self._apply(change)
+            if changes:
+                self._seq = changes[-1]["seq"]
+            if self._seq >= last_seq:
+                return
+
+    def _rebuild(self):
+        self._docs = {}  # doc number -> _Doc
+        self._postings = {}  # term -> {doc number: weight}
+        self._vocab = []  # sorted terms, for prefix lookups
+        self._total_length = 0
+        self._order = {}  # list collection -> [doc number per position]
+        self._days = {}  # logs date -> [doc numbers]
+        with self.store.locked(*self.files.values()):
+            self._seq = self.change_log.last_seq
+            for name, filename in self.files.items():
+                self._load(name, self.store.load(filename, []))
+            # Setting a day is idempotent, so a log write racing this load is
+            # simply applied again from the change log
+            for name, partition in self.partitions.items():
+                self._load(name, partition.load()[0])
+
+    def _load(self, name, data):
+        if name == "logs":
+            for date, entries in (data.items() if isinstance(data, dict) else []):
+                self._set_day(date, entries)
+        else:
+            self._order[name] = [self._add(name, r) for r in (data if isinstance(data, list) else [])]
+
+    def _apply(self, change):
+        name, op = change["collection"], change["op"]
+        if name == "logs":
+            return self._set_day(change["key"], [] if op == "delete" else change["value"] or [])
+
+        order = self._order.setdefault(name, [])
+        key = change["key"]
+        if op == "delete":
+            self._remove(order.pop(key))
+        elif key < len(order):
+            self._remove(order[key])
+            order[key] = self._add(name, change["value"])
+        else:
+            order.append(self._add(name, change["value"]))
+
+    def _set_day(self, date, entries):
+        for doc in self._days.pop(date, []):
+            self._remove(doc)
+        if isinstance(entries, list) and entries:
+            self._days[date] = [self._add("logs", e, (date, i)) for i, e in enumerate(entries)]
+
+    def _add(self, collection, record, key=None):
+        if not isinstance(record, dict):
+            record = {}
+        doc = _Doc(collection, record.get("id") if key is None else key, record)
+        number = self._next_doc
+        self._next_doc += 1
+        self._docs[number] = doc
+        self._total_length += doc.length
+        for term, weight in doc.terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._vocab, term)
+            postings[number] = weight
+        return number
+
+    def _remove(self, number):
+        doc = self._docs.pop(number)
+        self._total_length -= doc.length
+        for term in doc.terms:
+            postings = self._postings[term]
+            del postings[number]
+            if not postings:
+                del self._postings[term]
+                del self._vocab[bisect_left(self._vocab, term)]
+
+    # --- ranking ---
+    def _expand(self, term):
+        """(term, weight) pairs a query word matches: itself, plus prefixes."""
+        matches = [(term, 1.0)] if term in self._postings else []
+        i = bisect_left(self._vocab, term)
+        for candidate in self._vocab[i:i + PREFIX_EXPANSIONS + 1]:
+            if not candidate.startswith(term):
+                break
+            if candidate != term:
+                matches.append((candidate, PREFIX_WEIGHT))
+        return matches
+
+    def _rank(self, terms, collections, limit):
+        n = len(self._docs)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1
+        scores = None
+        for term in terms:
+            # Every query word has to match (itself or as a prefix)
+            term_scores = {}
+            for word, weight in self._expand(term):
+                postings = self._postings[word]
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for number, tf in postings.items():
+                    length = self._docs[number].length
+                    score = weight * idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+                    term_scores[number] = max(term_scores.get(number, 0), score)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {d: s + term_scores[d] for d, s in scores.items() if d in term_scores}
+            if not scores:
+                return []
+
+        wanted = set(collections)
+        ranked = heapq.nlargest(limit, ((s, d) for d, s in scores.items() if self._docs[d].collection in wanted))
+        results = []
+        for score, number in ranked:
+            doc = self._docs[number]
+            result = {"collection": doc.collection, "score": round(score, 4), "record": doc.record}
+            if doc.collection == "logs":
+                result["date"], result["index"] = doc.key
+            else:
+                result["id"] = doc.key
+            results.append(result)
+        return results
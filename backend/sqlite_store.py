@@ -0,0 +1,321 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from store import CollectionLock, describe, empty_for, lock_all
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,              -- 'list' or 'dict'
+    version INTEGER NOT NULL DEFAULT 0,
+    modified REAL                    -- unix time of the last write
+);
+CREATE TABLE IF NOT EXISTS records (
+    rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    key TEXT,                        -- dict collections only (log date, reflection week...)
+    id TEXT,
+    num_id INTEGER,                  -- integer ids (notes) for MAX() lookups
+    data TEXT NOT NULL,
+    UNIQUE (collection, key)
+);
+CREATE INDEX IF NOT EXISTS records_id ON records (collection, id);
+CREATE INDEX IF NOT EXISTS records_num_id ON records (collection, num_id);
+-- Date windows and completed filters are answered from the in-memory copy
+-- (query.py), so these only cost writes; databases that have them lose them.
+DROP INDEX IF EXISTS records_date;
+DROP INDEX IF EXISTS records_completed;
+"""
+
+
+def _columns(value):
+    if not isinstance(value, dict):
+        return None, None
+    raw_id = value.get("id")
+    num_id = raw_id if isinstance(raw_id, int) and not isinstance(raw_id, bool) else None
+    return None if raw_id is None else str(raw_id), num_id
+
+
+class _Entry:
+    def __init__(self, data, rowids, version):
+        self.data = data
+        self.rowids = rowids  # list collections: rowid of each position, ascending
+        self.version = version
+
+
+# === SQLITE STORE ===
+# Same interface as store.Store, but every collection lives in one SQLite
+# database (WAL mode), indexed by id for find() and max_id(). Collections are
+# still cached in memory; the per-collection version counter tells us when
+# another worker has written.
+class SqliteStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._locks = {}
+        self._load_hooks = {}
+        self._write_hooks = []
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(collections)")]
+        if "modified" not in columns:  # databases created before Last-Modified support
+            self._conn.execute("ALTER TABLE collections ADD COLUMN modified REAL")
+
+    def _name(self, filename):
+        return os.path.splitext(os.path.basename(filename))[0]
+
+    def lock(self, filename):
+        name = self._name(filename)
+        with self._lock:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = CollectionLock(f"{self.path}.{name}.lock")
+            return lock
+
+    def locked(self, *filenames):
+        return lock_all(self.lock(f) for f in filenames)
+
+    def on_load(self, filename, fn):
+        self._load_hooks[self._name(filename)] = fn
+
+    def on_write(self, fn):
+        self._write_hooks.append(fn)
+
+    def _notify(self, filename, changes):
+        for fn in self._write_hooks:
+            try:
+                fn(filename, changes)
+            except Exception as e:
+                print("Store write hook error:", e)
+
+    # --- reading ---
+    def load(self, filename, default):
+        with self._lock:
+            entry = self._refresh(self._name(filename))
+            if entry is None:
+                return default
+            return entry.data
+
+    def version(self, filename):
+        with self._lock:
+            entry = self._refresh(self._name(filename))
+            return 0 if entry is None else entry.version
+
+    def modified(self, filename):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT modified FROM collections WHERE name = ?", (self._name(filename),)).fetchone()
+        return row[0] if row else None
+
+    def load_versioned(self, filename, default):
+        with self._lock:
+            entry = self._refresh(self._name(filename))
+            if entry is None:
+                return default, 0
+            return entry.data, entry.version
+
+    def _refresh(self, name):
+        row = self._conn.execute("SELECT kind, version FROM collections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self._entries.pop(name, None)
+            return None
+
+        kind, version = row
+        entry = self._entries.get(name)
+        if entry and entry.version == version:
+            return entry
+
+        rows = self._conn.execute(
+            "SELECT rowid, key, data FROM records WHERE collection = ? ORDER BY rowid", (name,)).fetchall()
+        if kind == "list":
+            entry = _Entry([json.loads(r[2]) for r in rows], [r[0] for r in rows], version)
+        else:
+            entry = _Entry({r[1]: json.loads(r[2]) for r in rows}, None, version)
+        self._entries[name] = entry
+        hook = self._load_hooks.get(name)
+        if hook:
+            hook(entry.data)
+        return entry
+
+    # --- lookups ---
+    def find(self, filename, field, value):
+        """Position of the first list item whose `field` equals `value`, or None."""
+        if field != "id":
+            raise ValueError("SqliteStore can only look up by id")
+        with self._lock:
+            name = self._name(filename)
+            entry = self._refresh(name)
+            if entry is None or entry.rowids is None:
+                return None
+            row = self._conn.execute(
+                "SELECT MIN(rowid) FROM records WHERE collection = ? AND id = ?", (name, str(value))).fetchone()
+            if row[0] is None:
+                return None
+            i = bisect.bisect_left(entry.rowids, row[0])
+            if i < len(entry.rowids) and entry.rowids[i] == row[0] and entry.data[i].get("id") == value:
+                return i
+            return None
+
+    def max_id(self, filename):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(num_id) FROM records WHERE collection = ?", (self._name(filename),)).fetchone()
+        return -1 if row[0] is None else row[0]
+
+    # --- writing ---
+    def append(self, filename, item):
+        self.extend(filename, [item])
+
+    def extend(self, filename, items):
+        items = list(items)
+        if items:
+            self._run(filename, {"op": "extend", "values": items})
+
+    def set(self, filename, key, value):
+        self._run(filename, {"op": "set", "key": key, "value": value})
+
+    def delete(self, filename, key):
+        self._run(filename, {"op": "delete", "key": key})
+
+    def batch(self, filename, records):
+        """Apply a list of append/extend/set/delete records in order, in one transaction."""
+        records = list(records)
+        if records:
+            self._run(filename, {"op": "batch", "records": records})
+
+    def _run(self, filename, record):
+        kind = "list" if isinstance(empty_for(record), list) else "dict"
+        with self._write(filename, kind) as tx:
+            for r in record["records"] if record["op"] == "batch" else [record]:
+                tx.changes += describe(tx.entry.data, r)
+                self._exec(tx.name, tx.entry, r)
+
+    def _exec(self, name, entry, record):
+        op = record["op"]
+        if op in ("append", "extend"):
+            for item in [record["value"]] if op == "append" else record["values"]:
+                cur = self._conn.execute(
+                    "INSERT INTO records (collection, id, num_id, data) VALUES (?, ?, ?, ?)",
+                    (name, *_columns(item), json.dumps(item)))
+                entry.data.append(item)
+                entry.rowids.append(cur.lastrowid)
+        elif op == "set":
+            key, value = record["key"], record["value"]
+            if entry.rowids is not None:
+                self._conn.execute(
+                    "UPDATE records SET id = ?, num_id = ?, data = ? WHERE rowid = ?",
+                    (*_columns(value), json.dumps(value), entry.rowids[key]))
+            else:
+                self._conn.execute(
+                    "INSERT INTO records (collection, key, id, num_id, data) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (collection, key) DO UPDATE SET id = excluded.id, num_id = excluded.num_id, "
+                    "data = excluded.data",
+                    (name, key, *_columns(value), json.dumps(value)))
+            entry.data[key] = value
+        elif op == "delete":
+            key = record["key"]
+            if entry.rowids is not None:
+                self._conn.execute("DELETE FROM records WHERE rowid = ?", (entry.rowids.pop(key),))
+                entry.data.pop(key)
+            else:
+                self._conn.execute("DELETE FROM records WHERE collection = ? AND key = ?", (name, key))
+                del entry.data[key]
+        else:
+            raise ValueError(f"Unknown op: {op}")
+
+    def save(self, filename, data):
+        kind = "list" if isinstance(data, list) else "dict"
+        with self._write(filename, kind) as tx:
+            name, entry = tx.name, tx.entry
+            tx.changes = [{"op": "reset"}]
+            self._conn.execute("DELETE FROM records WHERE collection = ?", (name,))
+            self._conn.execute("UPDATE collections SET kind = ? WHERE name = ?", (kind, name))
+            insert = "INSERT INTO records (collection, key, id, num_id, data) VALUES (?, ?, ?, ?, ?)"
+            if kind == "list":
+                entry.data, entry.rowids = [], []
+                for value in data:
+                    cur = self._conn.execute(insert, (name, None, *_columns(value), json.dumps(value)))
+                    entry.data.append(value)
+                    entry.rowids.append(cur.lastrowid)
+            else:
+                entry.data, entry.rowids = {}, None
+                for key, value in data.items():
+                    self._conn.execute(insert, (name, key, *_columns(value), json.dumps(value)))
+                    entry.data[key] = value
+
+    def _write(self, filename, kind):
+        return _Transaction(self, filename, kind)
+
+    # Nothing is buffered outside SQLite; kept for interface parity with Store.
+    def flush(self):
+        pass
+
+    def compact(self, filename):
+        pass
+
+    def invalidate(self, filename=None):
+        with self._lock:
+            if filename is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._name(filename), None)
+
+
+class _Transaction:
+    """Runs one write in a BEGIN IMMEDIATE transaction under the collection lock,
+    bumps the collection version and then passes `changes` to the write hooks."""
+
+    def __init__(self, store, filename, kind):
+        self.store = store
+        self.filename = filename
+        self.name = store._name(filename)
+        self.kind = kind
+        self.entry = None
+        self.changes = []
+
+    def __enter__(self):
+        s = self.store
+        self.collection_lock = s.lock(self.filename)
+        self.collection_lock.__enter__()
+        s._lock.acquire()
+        try:
+            s._conn.execute("BEGIN IMMEDIATE")
+            entry = s._refresh(self.name)
+            if entry is None:
+                s._conn.execute("INSERT INTO collections (name, kind) VALUES (?, ?)", (self.name, self.kind))
+                entry = s._refresh(self.name)
+            self.entry = entry
+        except Exception:
+            if s._conn.in_transaction:
+                s._conn.execute("ROLLBACK")
+            s._lock.release()
+            self.collection_lock.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        s = self.store
+        try:
+            try:
+                if exc_type is None:
+                    s._conn.execute("UPDATE collections SET version = version + 1, modified = ? WHERE name = ?",
+                                    (time.time(), self.name))
+                    s._conn.execute("COMMIT")
+                    s._entries[self.name].version += 1
+                else:
+                    s._conn.execute("ROLLBACK")
+                    s._entries.pop(self.name, None)  # in-memory copy may be half-updated
+            finally:
+                s._lock.release()
+            if exc_type is None:
+                s._notify(self.filename, self.changes)
+        finally:
+            self.collection_lock.__exit__(None, None, None)
+        return False
@@ -0,0 +1,551 @@
+import atexit
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+FSYNC_INTERVAL = float(os.environ.get("JOURNAL_FSYNC_INTERVAL", "0.2"))
+COMPACT_RECORDS = int(os.environ.get("JOURNAL_COMPACT_RECORDS", "500"))
+COMPACT_IDLE = float(os.environ.get("JOURNAL_COMPACT_IDLE", "30"))
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _signature(st):
+    if st is None:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _apply(data, record):
+    op = record["op"]
+    if op in ("set", "delete"):
+        key = record["key"]
+        if isinstance(key, bool) or not isinstance(key, int if isinstance(data, list) else str):
+            raise TypeError(f"Key {key!r} can't address a {type(data).__name__}")
+    if op == "append":
+        data.append(record["value"])
+    elif op == "extend":
+        data.extend(record["values"])
+    elif op == "set":
+        data[record["key"]] = record["value"]
+    elif op == "delete":
+        if isinstance(data, list):
+            data.pop(record["key"])
+        else:
+            del data[record["key"]]
+    elif op == "batch":
+        for r in record["records"]:
+            _apply(data, r)
+    else:
+        raise ValueError(f"Unknown journal op: {op}")
+
+
+class CollectionLock:
+    """Reentrant per-collection lock.
+
+    A thread lock serialises this process; an fcntl lock on `path` makes other
+    gunicorn workers wait as well.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except Exception:
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+        return False
+
+    @property
+    def held(self):
+        return self._depth > 0 and self._lock._is_owned()
+
+
+def describe(data, record):
+    """Change-feed entries (insert/update/delete) for a journal record about to
+    be applied to `data`."""
+    op = record["op"]
+    if op == "append":
+        return [{"op": "insert", "key": len(data), "value": record["value"]}]
+    if op == "extend":
+        return [{"op": "insert", "key": len(data) + i, "value": v} for i, v in enumerate(record["values"])]
+    if op == "set":
+        exists = record["key"] < len(data) if isinstance(data, list) else record["key"] in data
+        return [{"op": "update" if exists else "insert", "key": record["key"], "value": record["value"]}]
+    return [{"op": "delete", "key": record["key"]}]
+
+
+def _records(record):
+    return record["records"] if record["op"] == "batch" else [record]
+
+
+def empty_for(record):
+    """The empty collection a journal record applies to: [] or {}."""
+    if record["op"] in ("append", "extend"):
+        return []
+    if record["op"] == "batch":
+        return empty_for(record["records"][0])
+    return [] if isinstance(record["key"], int) else {}
+
+
+def lock_all(locks):
+    """Hold several collection locks at once, always taken in path order."""
+    stack = contextlib.ExitStack()
+    for lock in sorted(set(locks), key=lambda l: l.path):
+        stack.enter_context(lock)
+    return stack
+
+
+class IdIndex:
+    """id -> position for a list collection, plus the largest integer id.
+
+    Appends and sets that keep the id update it in place; a delete anywhere but
+    the end shifts positions, so that (or an id change) drops the index and
+    the next lookup rebuilds it.
+    """
+
+    def __init__(self, items):
+        self.positions = {}
+        self.max_int = -1
+        for i, item in enumerate(items):
+            self._add(item, i)
+
+    def _add(self, item, i):
+        record_id = item.get("id") if isinstance(item, dict) else None
+        if isinstance(record_id, (str, int)) and not isinstance(record_id, bool):
+            self.positions.setdefault(record_id, i)
+            if isinstance(record_id, int):
+                self.max_int = max(self.max_int, record_id)
+
+    def update(self, data, record):
+        """Account for `record` about to be applied to `data`; False if the
+        index can't follow it and has to be rebuilt."""
+        op = record["op"]
+        if op == "append":
+            self._add(record["value"], len(data))
+        elif op == "extend":
+            for i, item in enumerate(record["values"]):
+                self._add(item, len(data) + i)
+        elif op == "set":
+            old, new = data[record["key"]], record["value"]
+            return isinstance(old, dict) and isinstance(new, dict) and old.get("id") == new.get("id")
+        elif op == "delete":
+            old = data[record["key"]]
+            old_id = old.get("id") if isinstance(old, dict) else None
+            if record["key"] != len(data) - 1 or old_id == self.max_int:
+                return False
+            if self.positions.get(old_id) == record["key"]:
+                del self.positions[old_id]
+        return True
+
+
+class _Entry:
+    def __init__(self, data, snap_sig, snap_hash, base_version=0):
+        self.data = data
+        self.snap_sig = snap_sig
+        self.snap_hash = snap_hash
+        self.base_version = base_version  # version of the snapshot itself
+        self.journal_ino = None
+        self.journal_pos = 0
+        self.stale_journal = False
+        self.records = 0
+        self.last_write = 0.0
+        self.ids = None  # IdIndex, built on first lookup by id
+
+    @property
+    def count(self):
+        """Writes since the collection was created (the journal header's "version")."""
+        return self.base_version + self.records
+
+    @property
+    def version(self):
+        # The snapshot hash tells apart a snapshot replaced from outside (a
+        # restore, a manual edit) that happens to land on the same count
+        return f"{self.count}-{self.snap_hash[:8]}"
+
+
+# === RESIDENT STORE ===
+# Keeps every data file parsed in memory and only goes back to disk when the
+# files on disk have changed underneath us (another worker, a manual edit...).
+#
+# Each collection is a snapshot (the plain JSON file, e.g. tasks.json) plus an
+# append-only journal next to it (tasks.json.journal). Mutations append one
+# small record to the journal; a background thread fsyncs journals in batches
+# and folds them back into the snapshot once they grow. The journal's first
+# line records a hash of the snapshot it applies to, so a journal left behind
+# by a crash halfway through compaction is recognised and ignored.
+#
+# Every write happens under the collection's lock (tasks.json.lock), and only
+# a lock holder ever repairs or replaces a journal. Readers just skip what they
+# can't use yet.
+class Store:
+    def __init__(self):
+        self._entries = {}  # filename -> _Entry
+        self._locks = {}  # filename -> CollectionLock
+        self._load_hooks = {}  # filename -> fn(data), run after every full reload
+        self._write_hooks = []  # fn(filename, changes), run after every write
+        self._dirty = set()  # journals written since the last fsync
+        self._lock = threading.RLock()
+        self._worker = None
+
+    def lock(self, filename):
+        with self._lock:
+            lock = self._locks.get(filename)
+            if lock is None:
+                lock = self._locks[filename] = CollectionLock(filename + ".lock")
+            return lock
+
+    def locked(self, *filenames):
+        return lock_all(self.lock(f) for f in filenames)
+
+    def on_write(self, fn):
+        """Run `fn(filename, changes)` after each write, still under the collection
+        lock. `changes` is a list of describe() entries, or [{"op": "reset"}]
+        when the whole collection was replaced."""
+        self._write_hooks.append(fn)
+
+    def _notify(self, filename, changes):
+        for fn in self._write_hooks:
+            try:
+                fn(filename, changes)
+            except Exception as e:
+                print("Store write hook error:", e)
+
+    def on_load(self, filename, fn):
+        """Run `fn(data)` whenever the collection is (re)read from disk."""
+        self._load_hooks[filename] = fn
+
+    # --- reading ---
+    def load(self, filename, default):
+        with self._lock:
+            entry = self._refresh(filename)
+            if entry is None:
+                return default
+            return entry.data
+
+    def version(self, filename):
+        """Opaque token that changes whenever the collection does."""
+        with self._lock:
+            entry = self._refresh(filename)
+            return 0 if entry is None else entry.version
+
+    def modified(self, filename):
+        """Unix time of the last write to the collection, or None."""
+        times = [st.st_mtime for st in (_stat(filename), _stat(filename + ".journal")) if st]
+        return max(times) if times else None
+
+    def load_versioned(self, filename, default):
+        """Data and version read together, for ETags that match the body."""
+        with self._lock:
+            entry = self._refresh(filename)
+            if entry is None:
+                return default, 0
+            return entry.data, entry.version
+
+    def _refresh(self, filename):
+        snap = _stat(filename)
+        if snap is None:
+            self._entries.pop(filename, None)
+            return None
+
+        entry = self._entries.get(filename)
+        if entry and entry.snap_sig == _signature(snap):
+            journal = _stat(filename + ".journal")
+            if journal is None and entry.journal_ino is None:
+                return entry
+            if journal and journal.st_ino == entry.journal_ino and journal.st_size >= entry.journal_pos:
+                if journal.st_size > entry.journal_pos:
+                    self._replay(filename, entry)
+                return entry
+
+        entry = self._reload(filename)
+        hook = self._load_hooks.get(filename)
+        if hook:
+            hook(entry.data)
+        return entry
+
+    def _reload(self, filename):
+        with open(filename, 'rb') as f:
+            raw = f.read()
+            snap = os.fstat(f.fileno())
+        entry = _Entry(json.loads(raw), _signature(snap), hashlib.sha1(raw).hexdigest())
+        self._entries[filename] = entry
+
+        journal_path = filename + ".journal"
+        try:
+            with open(journal_path, 'rb') as f:
+                header = f.readline()
+                journal = os.fstat(f.fileno())
+                stale_records = sum(1 for _ in f)
+        except FileNotFoundError:
+            return entry
+
+        try:
+            header_data = json.loads(header)
+        except ValueError:
+            header_data = {}
+        if header_data.get("base") != entry.snap_hash:
+            # Leftover from an interrupted compaction (or one still running in
+            # another worker): the snapshot already contains these records.
+            entry.base_version = header_data.get("version", 0) + stale_records
+            entry.journal_ino = journal.st_ino
+            entry.journal_pos = journal.st_size
+            entry.stale_journal = True
+            if self.lock(filename).held:
+                self._reset_journal(filename, entry)
+            return entry
+
+        entry.base_version = header_data.get("version", 0)
+        entry.journal_ino = journal.st_ino
+        entry.journal_pos = len(header)
+        self._replay(filename, entry)
+        return entry
+
+    def _replay(self, filename, entry):
+        with open(filename + ".journal", 'r+b') as f:
+            f.seek(entry.journal_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn write. Under the lock the writer must have died
+                    # mid-record, so cut it off to keep the next append on a
+                    # clean line; otherwise it may still be in progress.
+                    if self.lock(filename).held:
+                        f.truncate(entry.journal_pos)
+                    break
+                record = json.loads(line)
+                for r in _records(record):
+                    if entry.ids is not None and not entry.ids.update(entry.data, r):
+                        entry.ids = None
+                    _apply(entry.data, r)
+                entry.journal_pos += len(line)
+                entry.records += 1
+
+    # --- lookups ---
+    def find(self, filename, field, value):
+        """Position of the first list item whose `field` equals `value`, or None.
+        Lookups by "id" go through the collection's IdIndex."""
+        with self._lock:
+            entry = self._refresh(filename)
+            if entry is None or not isinstance(entry.data, list):
+                return None
+            if field == "id":
+                return self._ids(entry).positions.get(value)
+            for i, item in enumerate(entry.data):
+                if isinstance(item, dict) and item.get(field) == value:
+                    return i
+            return None
+
+    def max_id(self, filename):
+        """Largest integer id in a list collection, -1 if there is none."""
+        with self._lock:
+            entry = self._refresh(filename)
+            if entry is None or not isinstance(entry.data, list):
+                return -1
+            return self._ids(entry).max_int
+
+    def _ids(self, entry):
+        if entry.ids is None:
+            entry.ids = IdIndex(entry.data)
+        return entry.ids
+
+    # --- writing ---
+    def append(self, filename, item):
+        self._write(filename, [], {"op": "append", "value": item})
+
+    def extend(self, filename, items):
+        if items:
+            self._write(filename, [], {"op": "extend", "values": list(items)})
+
+    def set(self, filename, key, value):
+        self._write(filename, [] if isinstance(key, int) else {}, {"op": "set", "key": key, "value": value})
+
+    def delete(self, filename, key):
+        self._write(filename, [] if isinstance(key, int) else {}, {"op": "delete", "key": key})
+
+    def batch(self, filename, records):
+        """Apply a list of append/extend/set/delete records in order as one
+        journal line, so they are persisted (and replayed) all or nothing."""
+        records = list(records)
+        if records:
+            self._write(filename, empty_for(records[0]), {"op": "batch", "records": records})
+
+    def save(self, filename, data):
+        with self.lock(filename):
+            with self._lock:
+                entry = self._refresh(filename)
+                self._write_snapshot(filename, data, 1 if entry is None else entry.count + 1)
+            self._notify(filename, [{"op": "reset"}])
+
+    def _write(self, filename, default, record):
+        with self.lock(filename):
+            with self._lock:
+                changes = self._append(filename, default, record)
+            self._notify(filename, changes)
+
+    def _append(self, filename, default, record):
+        # The record is applied in memory before it is written, so one that
+        # doesn't apply (wrong key type, index out of range...) raises here and
+        # never reaches the journal, where every replay would trip over it.
+        line = (json.dumps(record) + "\n").encode()
+        entry = self._refresh(filename)
+        if entry is None:
+            trial = type(default)()
+            for r in _records(record):
+                _apply(trial, r)
+            entry = self._write_snapshot(filename, default, 0)
+        if entry.journal_ino is None or entry.stale_journal:
+            self._reset_journal(filename, entry)
+
+        changes = []
+        try:
+            for r in _records(record):
+                changes += describe(entry.data, r)
+                if entry.ids is not None and not entry.ids.update(entry.data, r):
+                    entry.ids = None
+                _apply(entry.data, r)
+            fd = os.open(filename + ".journal", os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except Exception:
+            # Possibly half applied: drop it, the next read goes back to disk
+            self._entries.pop(filename, None)
+            raise
+        entry.journal_pos += len(line)
+        entry.records += 1
+        entry.last_write = time.monotonic()
+        self._dirty.add(filename + ".journal")
+        self._start_worker()
+        return changes
+
+    def _write_snapshot(self, filename, data, version):
+        body = json.dumps(data, indent=2).encode()
+        tmp = filename + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+
+        entry = _Entry(data, _signature(_stat(filename)), hashlib.sha1(body).hexdigest(), version)
+        self._reset_journal(filename, entry)
+        with self._lock:
+            self._entries[filename] = entry
+        return entry
+
+    def _reset_journal(self, filename, entry):
+        journal_path = filename + ".journal"
+        entry.base_version = entry.count
+        header = (json.dumps({"base": entry.snap_hash, "version": entry.base_version}) + "\n").encode()
+        tmp = journal_path + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, journal_path)
+        self._fsync_dir(filename)
+
+        entry.journal_ino = _stat(journal_path).st_ino
+        entry.journal_pos = len(header)
+        entry.stale_journal = False
+        entry.records = 0
+
+    def _fsync_dir(self, filename):
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --- background flush / compaction ---
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        for path in dirty:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # compacted away; the snapshot was fsynced
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def compact(self, filename):
+        # Only the collection lock is held while the snapshot is written: it
+        # keeps writers out, so the data can't change underneath json.dumps,
+        # and readers of every collection carry on meanwhile. A reader that
+        # sees the new snapshot before its journal is reset takes the journal
+        # for a stale one, which is right.
+        with self.lock(filename):
+            with self._lock:
+                entry = self._refresh(filename)
+                if entry is None or entry.records == 0:
+                    return
+            self._write_snapshot(filename, entry.data, entry.count)
+
+    def _start_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._maintenance, name="store-maintenance", daemon=True)
+            self._worker.start()
+
+    def _maintenance(self):
+        while True:
+            time.sleep(FSYNC_INTERVAL)
+            try:
+                self.flush()
+                now = time.monotonic()
+                for filename, entry in list(self._entries.items()):
+                    if entry.records >= COMPACT_RECORDS or (
+                            entry.records and now - entry.last_write > COMPACT_IDLE):
+                        self.compact(filename)
+            except Exception as e:
+                print("Store maintenance error:", e)
+
+    def invalidate(self, filename=None):
+        with self._lock:
+            if filename is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(filename, None)
+
+
+def open_store(data_dir):
+    """Build the storage backend picked by STORAGE_BACKEND (json or sqlite)."""
+    backend = os.environ.get("STORAGE_BACKEND", "json")
+    if backend == "sqlite":
+        from sqlite_store import SqliteStore
+        s = SqliteStore(os.environ.get("SQLITE_PATH", os.path.join(data_dir, "planner.db")))
+    elif backend == "json":
+        s = Store()
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    atexit.register(s.flush)
+    return s
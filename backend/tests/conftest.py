@@ -0,0 +1,37 @@
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its settings when it is imported: point it at a scratch data
+# directory and the local AI stand-in before anything imports it.
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="planner-tests-")
+os.environ["AI_CLIENT"] = "fake"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def fresh_app(monkeypatch):
+    """Import a separate copy of app.py on the JSON files in `data_dir`, for
+    startup migrations."""
+    def load(data_dir):
+        monkeypatch.setenv("DATA_DIR", str(data_dir))
+        monkeypatch.setenv("STORAGE_BACKEND", "json")
+        monkeypatch.delitem(sys.modules, "app", raising=False)
+        module = importlib.import_module("app")
+        monkeypatch.setitem(sys.modules, "app", module)
+        return module
+    return load
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+import pytest
+
+from ai_jobs import FakeClient, JobQueue, prompt_key, with_retries
+from store import Store
+
+RETRY_ON = (TimeoutError, ConnectionError)
+
+
+def flaky(client, errors):
+    """Make the client's next calls raise `errors` (one per call) before answering."""
+    create = client.chat.completions.create
+    errors = list(errors)
+
+    def create_or_fail(**kwargs):
+        if errors:
+            client.calls += 1
+            raise errors.pop(0)
+        return create(**kwargs)
+
+    client.chat.completions.create = create_or_fail
+    return client
+
+
+def runner(client, retries=2):
+    def run(payload):
+        response, attempts = with_retries(
+            lambda: client.chat.completions.create(model="test", messages=[{"role": "user", "content": payload["prompt"]}]),
+            RETRY_ON, retries=retries, backoff=0)
+        return {**json.loads(response.choices[0].message.content), "attempts": attempts}
+    return run
+
+
+def wait(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+@pytest.fixture
+def jobs_file(tmp_path):
+    return str(tmp_path / "ai_jobs.json")
+
+
+def test_job_runs_to_done(jobs_file):
+    client = FakeClient()
+    queue = JobQueue(Store(), jobs_file, runner(client))
+    job, outcome = queue.submit({"prompt": "buy milk\ncall mom"}, prompt_key("buy milk\ncall mom", "2025-07-14"))
+    assert outcome == "miss" and job["status"] == "queued"
+
+    job = wait(queue, job["id"])
+    assert job["status"] == "done"
+    assert job["result"] == {"tasks": [{"title": "buy milk"}, {"title": "call mom"}], "attempts": 1}
+    assert client.calls == 1
+
+
+def test_timeouts_are_retried(jobs_file):
+    client = flaky(FakeClient(), [TimeoutError("slow"), ConnectionError("reset")])
+    queue = JobQueue(Store(), jobs_file, runner(client))
+    job = wait(queue, queue.submit({"prompt": "water plants"})[0]["id"])
+    assert job["status"] == "done"
+    assert job["result"]["attempts"] == 3
+    assert client.calls == 3
+
+
+def test_permanent_failures_fail_the_job(jobs_file):
+    client = flaky(FakeClient(), [ValueError("bad request")])
+    queue = JobQueue(Store(), jobs_file, runner(client))
+    key = prompt_key("water plants", "2025-07-14")
+    job = wait(queue, queue.submit({"prompt": "water plants"}, key)[0]["id"])
+    assert job["status"] == "failed" and job["error"] == "bad request"
+    assert client.calls == 1  # not a retryable error
+
+    # Out of retries counts as failed too
+    client = flaky(FakeClient(), [TimeoutError("slow")] * 3)
+    queue = JobQueue(Store(), jobs_file, runner(client, retries=2))
+    job = wait(queue, queue.submit({"prompt": "feed cat"})[0]["id"])
+    assert job["status"] == "failed" and client.calls == 3
+
+    # A failed job isn't served from the cache: the prompt runs again
+    again, outcome = queue.submit({"prompt": "water plants"}, key)
+    assert outcome == "miss"
+    assert wait(queue, again["id"])["status"] == "done"
+
+
+def test_duplicate_prompts_share_one_call(jobs_file):
+    client = FakeClient()
+    release = threading.Event()
+    run = runner(client)
+
+    def held_run(payload):
+        release.wait(5)  # keep the first job running while the others come in
+        return run(payload)
+
+    queue = JobQueue(Store(), jobs_file, held_run)
+
+    first, outcome = queue.submit({"prompt": "Plan my week"}, prompt_key("Plan my week", "2025-07-14"))
+    assert outcome == "miss"
+    second, outcome = queue.submit({"prompt": "plan  my week!"}, prompt_key("plan  my week!", "2025-07-14"))
+    assert outcome == "coalesced" and second["id"] == first["id"]
+
+    release.set()
+    assert wait(queue, first["id"])["status"] == "done"
+    third, outcome = queue.submit({"prompt": "plan my week"}, prompt_key("plan my week", "2025-07-14"))
+    assert outcome == "hit" and third["id"] == first["id"] and third["status"] == "done"
+
+    other, outcome = queue.submit({"prompt": "plan my week"}, prompt_key("plan my week", "2025-07-15"))
+    assert outcome == "miss" and other["id"] != first["id"]
+    wait(queue, other["id"])
+    assert client.calls == 2
+    assert queue.cache_info()["hit_rate"] == 0.5
+
+
+def test_ai_route_adds_the_tasks(client, app_module):
+    r = client.post("/ai", json={"prompt": "stretch\nread a chapter"})
+    assert r.status_code == 202 and r.headers["X-AI-Cache"] == "miss"
+    job = wait(app_module.ai_queue, r.get_json()["job_id"])
+    assert [t["title"] for t in job["result"]["tasks"]] == ["stretch", "read a chapter"]
+    titles = [t.get("title") for t in app_module.store.load(app_module.TASK_FILE, [])]
+    assert "stretch" in titles and "read a chapter" in titles
+
+    r = client.post("/ai", json={"prompt": "Stretch\nread a chapter."})
+    assert r.status_code == 200 and r.headers["X-AI-Cache"] == "hit"
@@ -0,0 +1,36 @@
+def ids_of(client, name):
+    return [item["id"] for item in client.get(f"/{name}").get_json()]
+
+
+def test_ids_follow_earlier_operations(client):
+    for text in ("one", "two", "three"):
+        client.post("/lessons", json={"title": text})
+    first, second, third = ids_of(client, "lessons")[-3:]
+
+    r = client.post("/batch", json={"operations": [
+        {"collection": "lessons", "op": "delete", "id": first},
+        {"collection": "lessons", "op": "create", "data": {"title": "four"}},
+        {"collection": "lessons", "op": "update", "id": third, "data": {"title": "THREE"}},
+        {"collection": "lessons", "op": "delete", "id": second},
+        {"collection": "lessons", "op": "toggle", "id": third},
+    ]})
+    assert r.status_code == 200, r.get_json()
+    results = r.get_json()["results"]
+    created = results[1]["item"]["id"]
+    lessons = {item["id"]: item for item in client.get("/lessons").get_json()}
+    assert first not in lessons and second not in lessons
+    assert lessons[third]["title"] == "THREE" and lessons[third]["completed"] is True
+    assert lessons[created]["title"] == "four"
+    assert results[4]["index"] == list(lessons).index(third)
+
+
+def test_unknown_or_deleted_ids_fail_the_batch(client):
+    client.post("/lessons", json={"title": "keep"})
+    keep = ids_of(client, "lessons")[-1]
+    for ops in ([{"collection": "lessons", "op": "delete", "id": "nope"}],
+                [{"collection": "lessons", "op": "delete", "id": keep},
+                 {"collection": "lessons", "op": "update", "id": keep, "data": {}}],
+                [{"collection": "lessons", "op": "delete", "id": [keep]}]):
+        r = client.post("/batch", json={"operations": ops})
+        assert r.status_code == 400 and r.get_json()["applied"] is False
+    assert keep in ids_of(client, "lessons")
@@ -0,0 +1,15 @@
+def test_windowed_focus_returns_the_records(client):
+    for day, text in [("2025-05-30", "before"), ("2025-06-02", "write"), ("2025-06-03", "review")]:
+        assert client.post("/focus", json={"date": day, "focus": text}).status_code == 201
+
+    r = client.get("/focus?start=2025-06-01&end=2025-06-30")
+    assert r.status_code == 200
+    days = r.get_json()
+    assert sorted(days) == ["2025-06-02", "2025-06-03"]
+    assert days["2025-06-02"]["focus"] == "write"
+
+    r = client.get("/focus?start=2025-06-01&end=2025-06-30&fields=focus")
+    assert r.get_json() == {"2025-06-02": {"focus": "write"}, "2025-06-03": {"focus": "review"}}
+
+    r = client.get("/focus?date=2025-06-03")
+    assert r.get_json()["focus"] == "review"
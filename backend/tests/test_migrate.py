@@ -0,0 +1,46 @@
+import json
+
+import migrate
+from sqlite_store import SqliteStore
+
+
+def test_every_collection_reaches_sqlite(tmp_path):
+    files = {
+        "tasks.json": [{"id": "t", "text": "a"}],
+        "collections.json": {"reading": [1, 2]},
+        "ai_jobs.json": {"j": {"id": "j", "status": "done"}},
+        "logs-2025-07.json": {"2025-07-14": [{"title": "x"}]},
+    }
+    for name, data in files.items():
+        (tmp_path / name).write_text(json.dumps(data))
+
+    db = str(tmp_path / "planner.db")
+    migrate.migrate(str(tmp_path), db)
+    target = SqliteStore(db)
+    for name, data in files.items():
+        assert target.load(str(tmp_path / name), None) == data, name
+
+
+def test_collections_move_into_the_data_dir(tmp_path, fresh_app, monkeypatch):
+    workdir, data_dir = tmp_path / "work", tmp_path / "data"
+    workdir.mkdir()
+    data_dir.mkdir()
+    (workdir / "collections.json").write_text(json.dumps({"reading": [3]}))
+    monkeypatch.chdir(workdir)
+
+    app = fresh_app(data_dir)
+    assert app.COLLECTIONS_FILE == str(data_dir / "collections.json")
+    assert app.app.test_client().get("/collections").get_json() == {"reading": [3]}
+    assert json.loads((data_dir / "collections.json").read_text()) == {"reading": [3]}
+
+
+def test_sqlite_store_keeps_only_the_id_indexes(tmp_path):
+    db = str(tmp_path / "planner.db")
+    store = SqliteStore(db)
+    store.extend(str(tmp_path / "notes.json"), [{"id": 4, "date": "2025-07-14", "completed": True}])
+    assert store.max_id(str(tmp_path / "notes.json")) == 4
+    assert store.find(str(tmp_path / "notes.json"), "id", 4) == 0
+    assert store.modified(str(tmp_path / "notes.json"))
+    indexes = {row[0] for row in store._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+               if not row[0].startswith("sqlite_")}
+    assert indexes == {"records_id", "records_num_id"}
@@ -0,0 +1,50 @@
+def test_windowed_reflections_return_the_records(client):
+    for week, well in [("2025-06-30", "shipped"), ("2025-07-14", "rested"), ("2025-08-04", "later")]:
+        r = client.post("/reflections", json={"week": week, "what_went_well": well, "what_to_improve": "sleep"})
+        assert r.status_code == 201
+
+    r = client.get("/reflections?start=2025-07-01&end=2025-07-30")
+    assert r.status_code == 200
+    assert r.get_json() == {"2025-07-14": {"what_went_well": "rested", "what_to_improve": "sleep"}}
+
+    r = client.get("/reflections?start=2025-07-01&end=2025-07-30&fields=what_went_well")
+    assert r.get_json() == {"2025-07-14": {"what_went_well": "rested"}}
+
+
+def test_windowed_logs_keep_their_entries(client):
+    client.post("/logs", json={"date": "2025-09-02", "title": "a", "content": "x"})
+    client.post("/logs", json={"date": "2025-09-02", "title": "b", "content": "y"})
+    r = client.get("/logs?start=2025-09-01&end=2025-09-30&fields=title")
+    assert r.get_json() == {"2025-09-02": [{"title": "a"}, {"title": "b"}]}
+
+
+def test_day_keys_must_be_dates(client):
+    assert client.post("/logs", json={"date": 5}).status_code == 400
+    assert client.post("/logs", json={"date": "2025-02-30"}).status_code == 400
+    assert client.post("/reflections", json={"week": 7}).status_code == 400
+    assert client.post("/logs", json={"date": "2025-09-03", "title": "still fine"}).status_code == 201
+
+
+def test_load_reads_the_manifest_once(tmp_path):
+    from partitions import Partitioned
+    from store import Store
+
+    store = Store()
+    logs = Partitioned(store, str(tmp_path), "logs")
+    logs.set("2025-07-14", [{"title": "a"}])
+    logs.set("2025-08-02", [{"title": "b"}])
+
+    # The manifest is replaced (another worker) right after the first read
+    load_versioned = store.load_versioned
+
+    def then_replace(filename, default):
+        result = load_versioned(filename, default)
+        if filename == logs.manifest:
+            store.save(logs.manifest, {"2025-09": {"days": 1, "archived": False}})
+        return result
+
+    store.load_versioned = then_replace
+    days, _ = logs.load("2025-07-01", "2025-08-31")
+    assert sorted(days) == ["2025-07-14", "2025-08-02"]
+    store.save(logs.manifest, {"2025-07": {"days": 1, "archived": False}, "2025-08": {"days": 1, "archived": False}})
+    assert logs.version("2025-07-01", "2025-08-31").count(".") == 2
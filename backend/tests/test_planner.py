@@ -0,0 +1,54 @@
+import threading
+from datetime import datetime
+
+
+def test_default_window_follows_the_week(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "get_vegas_time", lambda: datetime(2025, 3, 5, 12, tzinfo=app_module.VEGAS))
+    first = client.get("/planner")
+    assert first.get_json()["start"] == "2025-03-03"
+
+    monkeypatch.setattr(app_module, "get_vegas_time", lambda: datetime(2025, 3, 12, 12, tzinfo=app_module.VEGAS))
+    r = client.get("/planner", headers={"If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 200
+    assert r.get_json()["start"] == "2025-03-10"
+    assert r.headers["ETag"] != first.headers["ETag"]
+
+    again = client.get("/planner", headers={"If-None-Match": r.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_bad_windows_are_400(client):
+    for query in ("start=2025-02-30", "start=2025-13-01", "start=2025-03-01&end=2025-02-30",
+                  "start=2025-03-10&end=2025-03-01", "start="):
+        assert client.get(f"/planner?{query}").status_code == 400, query
+        assert client.get(f"/schedule?{query}").status_code == 400, query
+    r = client.get("/planner?start=2025-03-01")
+    assert (r.get_json()["start"], r.get_json()["end"]) == ("2025-03-01", "2025-03-07")
+
+
+def test_planner_body_is_built_outside_the_locks(client, app_module, monkeypatch):
+    building, release = threading.Event(), threading.Event()
+    window_days = app_module.query.window_days
+
+    def slow_window_days(*args):
+        building.set()
+        release.wait(5)
+        return window_days(*args)
+
+    monkeypatch.setattr(app_module.query, "window_days", slow_window_days)
+    reader = threading.Thread(target=client.get, args=("/planner?start=2025-04-07",))
+    reader.start()
+    assert building.wait(5)
+
+    # A write to a planner collection goes through while the body is built
+    writer_client = app_module.app.test_client()
+    writes = []
+    writer = threading.Thread(target=lambda: writes.append(
+        writer_client.post("/tasks", json={"text": "meanwhile", "date": "2025-04-08"}).status_code))
+    writer.start()
+    writer.join(2)
+    done_early = list(writes)
+    release.set()
+    reader.join(5)
+    writer.join(5)
+    assert done_early == [201]
@@ -0,0 +1,18 @@
+def test_rule_without_occurrences_is_rejected(client):
+    r = client.post("/schedule", json={"title": "never", "date": "2025-07-07", "repeat": "FREQ=WEEKLY;UNTIL=20250601"})
+    assert r.status_code == 400
+    assert "rule produces no occurrences" in r.get_json()["error"]
+
+
+def test_occurrences_keep_the_time_of_day(client):
+    client.post("/schedule", json={"title": "standup", "date": "2025-07-07T09:30:00", "repeat": "weekly"})
+    client.post("/schedule", json={"title": "call", "date": "2025-03-03T09:00:00-08:00",
+                                   "repeat": "FREQ=WEEKLY;COUNT=2"})
+
+    days = client.get("/schedule?start=2025-07-01&end=2025-07-20").get_json()
+    standups = [item["date"] for item in days if item.get("title") == "standup"]
+    assert standups == ["2025-07-07T09:30:00", "2025-07-14T09:30:00"]
+
+    days = client.get("/schedule?start=2025-03-01&end=2025-03-31").get_json()
+    calls = [item["date"] for item in days if item.get("title") == "call"]
+    assert calls == ["2025-03-03T09:00:00-08:00", "2025-03-10T09:00:00-07:00"]
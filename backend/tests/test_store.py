@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+
+import store as store_module
+from store import Store
+
+
+def test_replaced_snapshot_changes_the_version(tmp_path):
+    path = str(tmp_path / "tasks.json")
+    store = Store()
+    store.append(path, {"id": "a"})
+    store.compact(path)
+    store.append(path, {"id": "b"})
+    before = store.version(path)
+
+    # Another copy of the file restored over the snapshot, leaving the journal
+    # behind: same write count, different content
+    with open(path + ".restore", "w") as f:
+        json.dump([{"id": "x"}, {"id": "y"}], f)
+    os.replace(path + ".restore", path)
+
+    assert store.load(path, []) == [{"id": "x"}, {"id": "y"}]
+    assert store.version(path) != before
+
+
+def test_compaction_doesnt_block_readers(tmp_path, monkeypatch):
+    tasks, goals = str(tmp_path / "tasks.json"), str(tmp_path / "goals.json")
+    store = Store()
+    store.append(tasks, {"id": "a"})
+    store.append(goals, {"id": "g"})
+
+    writing, release = threading.Event(), threading.Event()
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        if threading.current_thread().name == "compact":
+            writing.set()
+            release.wait(5)
+        fsync(fd)
+
+    monkeypatch.setattr(store_module.os, "fsync", slow_fsync)
+    compactor = threading.Thread(target=store.compact, args=(tasks,), name="compact")
+    compactor.start()
+    assert writing.wait(5)
+
+    reads = []
+    reader = threading.Thread(target=lambda: reads.append((store.load(goals, []), store.load(tasks, []))))
+    reader.start()
+    reader.join(2)
+    release.set()
+    compactor.join(5)
+    assert reads == [([{"id": "g"}], [{"id": "a"}])]
+    assert store.load(tasks, []) == [{"id": "a"}]
+
+
+def test_replay_keeps_the_id_index(tmp_path):
+    path = str(tmp_path / "notes.json")
+    mine, other = Store(), Store()  # two workers sharing the files
+    mine.extend(path, [{"id": 0}, {"id": 1}])
+    assert mine.find(path, "id", 1) == 1
+    index = mine._entries[path].ids
+
+    other.append(path, {"id": 2})
+    other.batch(path, [{"op": "set", "key": 0, "value": {"id": 0, "title": "x"}},
+                       {"op": "append", "value": {"id": 3}}])
+    assert mine.find(path, "id", 3) == 3
+    assert mine.max_id(path) == 3
+    assert mine._entries[path].ids is index
+
+    other.delete(path, 0)  # shifts every position: the index is rebuilt
+    assert mine.find(path, "id", 3) == 2
+    assert mine._entries[path].ids is not index
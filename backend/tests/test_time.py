@@ -0,0 +1,24 @@
+def test_time_entries_need_a_real_date(client):
+    assert client.post("/time", json={"date": "2025-99-14", "minutes": 30}).status_code == 400
+    assert client.post("/time", json={"date": "2025-02-29", "minutes": 30}).status_code == 400
+    assert client.post("/time", json={"date": "2025-03-14", "minutes": 0}).status_code == 400
+    assert client.post("/time", json={"date": "2025-03-14", "minutes": 30}).status_code == 201
+
+
+def test_summary_rejects_impossible_dates(client):
+    for day in ("2025-02-30", "2025-13-01", "soon"):
+        assert client.get(f"/time/summary?date={day}").status_code == 400
+    r = client.get("/time/summary?date=2025-03-14")
+    assert r.status_code == 200 and r.get_json()["week"]["start"] == "2025-03-10"
+
+
+def test_minutes_are_whole_numbers(client):
+    assert client.post("/time", json={"date": "2025-03-14", "minutes": 0.5}).status_code == 400
+    assert client.post("/time", json={"date": "2025-03-14", "minutes": 1441}).status_code == 400
+    assert client.post("/time", json={"date": "2025-03-14", "minutes": "30"}).status_code == 400
+
+
+def test_time_window_must_be_dates(client):
+    assert client.get("/time?start=zzz").status_code == 400
+    assert client.get("/time?end=2025-02-30").status_code == 400
+    assert client.get("/time?start=2025-03-01&end=2025-03-31").status_code == 200
@@ -0,0 +1,23 @@
+import json
+import os
+
+
+def test_dict_time_file_becomes_a_session_list(tmp_path, fresh_app):
+    (tmp_path / "time.json").write_text("{}")
+    app = fresh_app(tmp_path)
+    client = app.app.test_client()
+
+    r = client.post("/time", json={"date": "2025-07-14", "minutes": 25, "category": "work"})
+    assert r.status_code == 201
+    assert client.get("/time").get_json() == {"2025-07-14": {"minutes": 25, "sessions": 1}}
+    assert app.store.load(app.TIME_FILE, None)[0]["minutes"] == 25
+
+
+def test_legacy_days_are_kept(tmp_path, fresh_app):
+    (tmp_path / "time.json").write_text(json.dumps({"2025-07-14": 30, "2025-07-15": {"minutes": 45}, "junk": 5}))
+    app = fresh_app(tmp_path)
+    client = app.app.test_client()
+
+    assert client.get("/time").get_json() == {"2025-07-14": {"minutes": 30, "sessions": 1},
+                                              "2025-07-15": {"minutes": 45, "sessions": 1}}
+    assert os.listdir(tmp_path / "archive")
@@ -1,7 +1,25 @@
 // === AI Helper Function ===
+// POST /ai queues the prompt and returns a job id; poll the job until the
+// backend has run it.
+const AI_API = 'https://avdevplanner.onrender.com';
+
+async function waitForAIJob(jobId) {
+  for (let attempt = 0; attempt < 120; attempt++) {
+    await new Promise((resolve) => setTimeout(resolve, attempt < 10 ? 500 : 1000));
+    const response = await fetch(`${AI_API}/ai/jobs/${jobId}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch AI job');
+    }
+    const job = await response.json();
+    if (job.status === 'done') return job.result;
+    if (job.status === 'failed') throw new Error(job.error || 'AI job failed');
+  }
+  throw new Error('AI job timed out');
+}
+
 async function callAI(prompt) {
   try {
-    const response = await fetch('https://avdevplanner.onrender.com/ai', {
+    const response = await fetch(`${AI_API}/ai`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
@@ -13,7 +31,11 @@ async function callAI(prompt) {
       throw new Error('Failed to fetch AI response');
     }
 
-    const data = await response.json();
+    let data = await response.json();
+    if (data.job_id) {
+      // A repeated prompt comes back already done
+      data = data.status === 'done' ? data.result : await waitForAIJob(data.job_id);
+    }
     return data.message || data.response || "AI responded, but something was unexpected.";
   } catch (error) {
     console.error('AI error:', error);
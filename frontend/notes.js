@@ -15,7 +15,10 @@ document.addEventListener("DOMContentLoaded", () => {
     filterBy: 'all',
     isFullscreen: false,
     isPreview: false,
-    autoSaveTimeout: null
+    autoSaveTimeout: null,
+    // Per note id, the content the server last confirmed and its revision;
+    // autosave sends only the edit since then
+    saved: {}
   };
 
   // === DOM ELEMENTS ===
@@ -81,6 +84,9 @@ document.addEventListener("DOMContentLoaded", () => {
       const notesResponse = await fetch('https://avdevplanner.onrender.com/notes');
       if (notesResponse.ok) {
         state.notes = await notesResponse.json();
+        state.notes.forEach(note => {
+          if (note.revision) state.saved[note.id] = { revision: note.revision, content: note.content || '' };
+        });
       }
       
       // Create default notebooks (stored in frontend state only for organization)
@@ -576,26 +582,60 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  // One splice turning `before` into `after`: keep the common start, delete
+  // what differs, insert the new text (the server keeps the common end)
+  function contentDelta(before, after) {
+    const max = Math.min(before.length, after.length);
+    let start = 0;
+    while (start < max && before[start] === after[start]) start++;
+    let end = 0;
+    while (end < max - start && before[before.length - 1 - end] === after[after.length - 1 - end]) end++;
+    const ops = [];
+    if (start) ops.push({ retain: start });
+    if (before.length - start - end) ops.push({ delete: before.length - start - end });
+    if (after.length - start - end) ops.push({ insert: after.slice(start, after.length - end) });
+    return ops;
+  }
+
   async function saveNote(note) {
     if (!note.id) return; // Don't save notes without ID
     
-    try {
-          const response = await fetch(`https://avdevplanner.onrender.com/notes/${note.id}`, {
-      method: 'PUT',
+    const content = note.content || '';
+    const saved = state.saved[note.id];
+    const body = {
+      title: note.title,
+      pinned: note.pinned || false,
+      tags: note.tags || [],
+      notebook: note.notebook || '',
+      modified_at: new Date().toISOString()
+    };
+    const send = () => fetch(`https://avdevplanner.onrender.com/notes/${note.id}`, {
+      method: 'PATCH',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({
-        title: note.title,
-        content: note.content,
-        pinned: note.pinned || false,
-        tags: note.tags || [],
-        notebook: note.notebook || '',
-        modified_at: new Date().toISOString()
-      })
+      body: JSON.stringify(body)
     });
+    
+    try {
+      if (saved) {
+        body.base = saved.revision;
+        body.delta = contentDelta(saved.content, content);
+      } else {
+        body.content = content;
+      }
+      let response = await send();
+      if (response.status === 409) {
+        // Changed somewhere else since our last save: send the whole text
+        delete body.base;
+        delete body.delta;
+        body.content = content;
+        response = await send();
+      }
       
       if (response.ok) {
+        const result = await response.json();
+        state.saved[note.id] = { revision: result.revision, content };
         updateCounts();
         // Update the note in local state
         const noteIndex = state.notes.findIndex(n => n.id === note.id);